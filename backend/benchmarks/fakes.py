@@ -0,0 +1,73 @@
+"""Local stand-ins for the external services, so the load benchmark measures the app rather than Cloudinary or Google.
+
+install_fakes() swaps them in. Call it after create_app(), which configures the real storage backend.
+"""
+from typing import BinaryIO
+import time
+import uuid
+
+import services.files_service.storage as storage_module
+import utils.auth.auth_utils as auth_utils
+from services.files_service import Storage
+
+
+class FakeStorage(Storage):
+    """Cloudinary-like storage that keeps nothing. latency (seconds) is slept in every call, like a network round trip."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.uploads = 0
+        self.deletes = 0
+
+    def upload(self, file: BinaryIO, key: str, folder: str, filename: str | None) -> str:
+        while file.read(1024 * 1024):
+            pass
+        time.sleep(self.latency)
+        self.uploads += 1
+        return f"https://res.cloudinary.com/bench/image/upload/v1/{folder.strip('/')}/{key}"
+
+    def delete(self, url: str) -> bool:
+        time.sleep(self.latency)
+        self.deletes += 1
+        return True
+
+
+class FakeGoogleClient:
+    """Answers the calls auth.google_callback makes with a random Google identity out of `accounts`, so the
+    callback alternates between signing up new users and logging in existing ones."""
+
+    def __init__(self, accounts: int):
+        self.accounts = accounts
+
+    async def authorize_redirect(self, request, redirect_uri):
+        from fastapi.responses import RedirectResponse
+
+        return RedirectResponse(f"{redirect_uri}?code=bench")
+
+    async def authorize_access_token(self, request) -> dict:
+        return {"access_token": "bench", "id_token": "bench"}
+
+    async def parse_id_token(self, request, token) -> dict:
+        account = uuid.uuid4().int % self.accounts
+        return {
+            "sub": f"bench-google-{account}",
+            "email": f"bench-google-{account}@bench.example.com",
+            "name": f"bench-google-{account}",
+            "given_name": "Bench",
+            "family_name": str(account),
+        }
+
+    async def userinfo(self, token) -> dict:
+        return await self.parse_id_token(None, token)
+
+
+class FakeOAuth:
+    def __init__(self, accounts: int):
+        self.google = FakeGoogleClient(accounts)
+
+
+def install_fakes(storage_latency: float = 0.0, google_accounts: int = 100) -> FakeStorage:
+    storage = FakeStorage(storage_latency)
+    storage_module.storage = storage
+    auth_utils.oauth = FakeOAuth(google_accounts)  # get_oauth() only builds the real client when this is None
+    return storage
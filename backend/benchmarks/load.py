@@ -0,0 +1,247 @@
+"""Load benchmark of the main endpoints at a fixed concurrency, against the database seeded by benchmarks.seed.
+
+Run from the backend/ directory:
+    python -m benchmarks.seed --users 1000 --reports 1000000
+    python -m benchmarks.load --concurrency 16 --requests 2000 --output results.json
+
+The app runs in this process behind httpx's ASGI transport, with Cloudinary and Google OAuth replaced by the fakes in
+benchmarks/fakes.py, so only the app and its database are measured. For each scenario it reports latency percentiles,
+throughput, status codes and the number of SQL statements per request. --output writes them as JSON, together with
+the git commit and the settings, to compare runs across commits.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+import httpx
+from dotenv import load_dotenv
+
+from benchmarks.seed import BENCH_PASSWORD, BENCH_ADMIN
+
+# SQL statements executed by the request being measured, set by the load worker before each request. The app runs
+# in the worker's task (and threadpool calls copy its context), so the engine event handler sees the right counter.
+query_counter: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar("query_counter", default=None)
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+@dataclass
+class BenchContext:
+    users: list[tuple[str, str]]  # (username, access token)
+    user_ids: list[str]
+    admin_token: str
+    upload_size: int
+
+
+@dataclass
+class ScenarioResult:
+    latencies: list[float] = field(default_factory=list)
+    queries: list[int] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def summary(self) -> dict:
+        percentiles = statistics.quantiles(self.latencies, n=100, method="inclusive")
+        return {
+            "requests": len(self.latencies),
+            "throughput_rps": len(self.latencies) / self.elapsed,
+            "latency_ms": {
+                "mean": statistics.fmean(self.latencies) * 1000,
+                "p50": percentiles[49] * 1000,
+                "p95": percentiles[94] * 1000,
+                "p99": percentiles[98] * 1000,
+                "max": max(self.latencies) * 1000,
+            },
+            "queries_per_request": {"mean": statistics.fmean(self.queries), "max": max(self.queries)},
+            "status_codes": {str(code): count for code, count in sorted(self.statuses.items())},
+        }
+
+
+def bearer(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def login(client: httpx.AsyncClient, ctx: BenchContext) -> httpx.Response:
+    username, _ = random.choice(ctx.users)
+    return await client.post("/auth/login", data={"username": username, "password": BENCH_PASSWORD})
+
+
+async def my_reports(client: httpx.AsyncClient, ctx: BenchContext) -> httpx.Response:
+    _, token = random.choice(ctx.users)
+    return await client.get("/reports", headers=bearer(token))
+
+
+async def admin_reports(client: httpx.AsyncClient, ctx: BenchContext) -> httpx.Response:
+    params = random.choice([{}, {"status": random.choice(["Pending", "Approved", "Rejected"])}, {"user_id": random.choice(ctx.user_ids)}])
+    return await client.get("/admin/reports", params={**params, "limit": 50}, headers=bearer(ctx.admin_token))
+
+
+async def admin_dashboard(client: httpx.AsyncClient, ctx: BenchContext) -> httpx.Response:
+    # The admin page's single request, reports with their employees embedded
+    return await client.get("/admin/reports", params={"limit": 50, "include_employee": True}, headers=bearer(ctx.admin_token))
+
+
+async def upload(client: httpx.AsyncClient, ctx: BenchContext) -> httpx.Response:
+    _, token = random.choice(ctx.users)
+    content = PNG + random.randbytes(ctx.upload_size)  # Unique content, so every upload is stored instead of deduplicated
+    files = {"file": ("receipt.png", content, "image/png")}
+    return await client.post("/reports", data={"title": "bench upload", "amount": "12.5"}, files=files, headers=bearer(token))
+
+
+async def google_callback(client: httpx.AsyncClient, ctx: BenchContext) -> httpx.Response:
+    return await client.get("/auth/google/callback", params={"code": "bench"})
+
+
+SCENARIOS: dict[str, Callable[[httpx.AsyncClient, BenchContext], Awaitable[httpx.Response]]] = {
+    "login": login,
+    "my_reports": my_reports,
+    "admin_reports": admin_reports,
+    "admin_dashboard": admin_dashboard,
+    "upload": upload,
+    "google_callback": google_callback,
+}
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: BenchContext, scenario: Callable, requests: int, concurrency: int) -> ScenarioResult:
+    result = ScenarioResult()
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            counter = [0]
+            query_counter.set(counter)
+            started = time.perf_counter()
+            response = await scenario(client, ctx)
+            result.latencies.append(time.perf_counter() - started)
+            result.queries.append(counter[0])
+            result.statuses[response.status_code] = result.statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def count_queries(conn, cursor, statement, parameters, context, executemany) -> None:
+    counter = query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def load_context(upload_size: int) -> tuple[BenchContext, dict]:
+    from sqlalchemy import func, select
+    from database import new_session
+    from models import User, ExpenseReport
+    from utils import create_access_token
+
+    with new_session() as db:
+        users = db.execute(select(User.id, User.username, User.role).where(User.username.like("bench-user-%"))).all()
+        admin = db.execute(select(User.id, User.username, User.role).where(User.username == BENCH_ADMIN)).one_or_none()
+        dataset = {"users": db.scalar(select(func.count()).select_from(User)), "reports": db.scalar(select(func.count()).select_from(ExpenseReport))}
+
+    if not users or admin is None:
+        raise SystemExit("No benchmark users found, run python -m benchmarks.seed first")
+
+    def token(user) -> str:
+        return create_access_token(data={"sub": user.username, "id": str(user.id), "role": user.role})
+
+    ctx = BenchContext(
+        users=[(user.username, token(user)) for user in users],
+        user_ids=[str(user.id) for user in users],
+        admin_token=token(admin),
+        upload_size=upload_size,
+    )
+    return ctx, dataset
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from sqlalchemy import event
+    from main import create_app
+    from database import get_engine, get_async_engine
+    from benchmarks.fakes import install_fakes
+
+    # The benchmark logs in from a single client address, the auth rate limits would reject most of it
+    os.environ.setdefault("AUTH_RATE_LIMIT_ENABLED", "false")
+    app = create_app()
+    fake_storage = install_fakes(storage_latency=args.storage_latency_ms / 1000)
+    event.listen(get_engine(), "before_cursor_execute", count_queries)
+    event.listen(get_async_engine().sync_engine, "before_cursor_execute", count_queries)
+
+    ctx, dataset = load_context(args.upload_size)
+    results = {}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in args.scenarios:
+                scenario = SCENARIOS[name]
+                await run_scenario(client, ctx, scenario, args.warmup, args.concurrency)
+                results[name] = (await run_scenario(client, ctx, scenario, args.requests, args.concurrency)).summary()
+                print_summary(name, results[name])
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "upload_size": args.upload_size,
+            "storage_latency_ms": args.storage_latency_ms,
+            "fake_storage_uploads": fake_storage.uploads,
+        },
+        "dataset": dataset,
+        "scenarios": results,
+    }
+
+
+def print_summary(name: str, summary: dict) -> None:
+    latency = summary["latency_ms"]
+    print(
+        f"{name:<16} {summary['throughput_rps']:8.1f} req/s   "
+        f"p50 {latency['p50']:8.1f} ms   p95 {latency['p95']:8.1f} ms   p99 {latency['p99']:8.1f} ms   "
+        f"{summary['queries_per_request']['mean']:5.1f} queries/req   {summary['status_codes']}"
+    )
+
+
+def main() -> None:
+    load_dotenv()
+    # The callback redirects there, any URL will do
+    os.environ.setdefault("FRONTEND_REDIRECT_URL", "http://localhost:5173/")
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="requests per scenario before measuring")
+    parser.add_argument("--upload-size", type=int, default=200 * 1024, help="bytes per uploaded file")
+    parser.add_argument("--storage-latency-ms", type=float, default=0.0, help="simulated latency of each storage call")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
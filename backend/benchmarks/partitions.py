@@ -0,0 +1,154 @@
+"""Latency of the report queries on recent months as the history in expense_reports grows, partitioned by month
+against the same reports in an unpartitioned copy of the table.
+
+Run from the backend/ directory: python -m benchmarks.partitions --years 1 2 4 8 --reports-per-month 10000
+Needs the same environment as the app and a migrated database. The copy is made in the bench_unpartitioned schema,
+with the indexes expense_reports had before it was partitioned. For each history length, reports of a
+bench-partitions user are added going back that many years (to both tables), then the queries are run through the
+ExpenseReport methods against either table. The reports, the user and the copy are removed at the end.
+"""
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+SCHEMA = "bench_unpartitioned"
+BENCH_USER = "bench-partitions"
+RUNS = 30
+
+COLUMNS = "id, user_id, title, date, amount, status, admin_comment, description, file"
+
+CREATE_COPY = (
+    f"CREATE SCHEMA {SCHEMA}",
+    f"CREATE TABLE {SCHEMA}.expense_reports (LIKE public.expense_reports INCLUDING DEFAULTS INCLUDING GENERATED)",
+    f"INSERT INTO {SCHEMA}.expense_reports ({COLUMNS}) SELECT {COLUMNS} FROM public.expense_reports",
+    f"ALTER TABLE {SCHEMA}.expense_reports ADD PRIMARY KEY (id)",
+    f"CREATE INDEX ON {SCHEMA}.expense_reports (user_id, date)",
+    f"CREATE INDEX ON {SCHEMA}.expense_reports (status, date)",
+    f"CREATE INDEX ON {SCHEMA}.expense_reports (date, id)",
+    f"CREATE INDEX ON {SCHEMA}.expense_reports USING gin (search_vector)",
+)
+
+# One report every step back from newest, to both tables. The months before the current one are fully decided, as
+# closed months are.
+INSERT_REPORTS = text(f"""
+    WITH added AS (
+        INSERT INTO public.expense_reports (user_id, title, date, amount, status, description)
+        SELECT CAST(:user_id AS uuid),
+               'partition bench ' || n,
+               CAST(:newest AS timestamp) - n * CAST(:step AS interval),
+               round((random() * 500)::numeric, 2),
+               CASE WHEN CAST(:newest AS timestamp) - n * CAST(:step AS interval) >= date_trunc('month', now())
+                    THEN (ARRAY['PENDING', 'APPROVED', 'REJECTED'])[1 + n % 3]
+                    ELSE (ARRAY['APPROVED', 'REJECTED'])[1 + n % 2] END::expensestatus,
+               'synthetic report'
+        FROM generate_series(:start, :stop) AS n
+        RETURNING {COLUMNS}
+    )
+    INSERT INTO {SCHEMA}.expense_reports ({COLUMNS}) SELECT {COLUMNS} FROM added
+""")
+
+
+def add_history(connection, user_id: uuid.UUID, reports_per_month: int, months_before: int, months: int) -> int:
+    """Adds the reports of the months_before + 1st to months_before + months-th month back, to both tables."""
+    step_seconds = 30 * 24 * 3600 / reports_per_month
+    params = {
+        "user_id": str(user_id),
+        "newest": datetime.now(),
+        "step": f"{step_seconds} seconds",
+        "start": months_before * reports_per_month,
+        "stop": (months_before + months) * reports_per_month - 1,
+    }
+    connection.execute(INSERT_REPORTS, params)
+    connection.execute(text("ANALYZE public.expense_reports"))
+    connection.execute(text(f"ANALYZE {SCHEMA}.expense_reports"))
+    return connection.scalar(text("SELECT count(*) FROM public.expense_reports"))
+
+
+def queries(recent_id: int) -> dict:
+    from models import ExpenseReport
+    from schema import ExpenseFilter
+
+    now = datetime.now()
+    this_month = ExpenseFilter(month=now.month, year=now.year)
+    return {
+        "newest page": lambda db: ExpenseReport.get_all_expenses(db, ExpenseFilter(), 50),
+        "month page": lambda db: ExpenseReport.get_all_expenses(db, this_month, 50),
+        "month, amount >= 490": lambda db: ExpenseReport.get_all_expenses(db, ExpenseFilter(month=now.month, year=now.year, min_amount=490), 50),
+        "month export": lambda db: sum(1 for _ in ExpenseReport.export_expenses(db, this_month)),
+        "report by id": lambda db: db.query(ExpenseReport).filter(ExpenseReport.id == recent_id).first(),
+    }
+
+
+def time_query(db: Session, query) -> tuple[float, float]:
+    """Median and p95 latency in ms, after a warm-up run."""
+    query(db)
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        query(db)
+        timings.append((time.perf_counter() - started) * 1000)
+        db.rollback()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def run(years: list[int], reports_per_month: int) -> None:
+    from database import get_engine
+
+    engine = get_engine()
+    # The same ORM queries, against the copy
+    unpartitioned = engine.execution_options(schema_translate_map={None: SCHEMA})
+    user_id = uuid.uuid4()
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(
+            "INSERT INTO users (id, username, email, is_active, role) VALUES (CAST(:id AS uuid), :username, :username || '@bench.example.com', true, 'USER')"
+        ), {"id": str(user_id), "username": BENCH_USER})
+        for statement in CREATE_COPY:
+            connection.execute(text(statement))
+
+    try:
+        months_done = 0
+        print(f"{'history':>8} {'rows':>10}  {'query':<22} {'partitioned ms':>20} {'unpartitioned ms':>20}")
+        for history in sorted(years):
+            with engine.begin() as connection:
+                rows = add_history(connection, user_id, reports_per_month, months_done, history * 12 - months_done)
+                recent_id = connection.scalar(text("SELECT max(id) FROM expense_reports WHERE user_id = CAST(:user_id AS uuid)"), {"user_id": str(user_id)})
+            months_done = history * 12
+
+            for name, query in queries(recent_id).items():
+                with Session(engine) as db:
+                    partitioned_ms = time_query(db, query)
+                with Session(unpartitioned) as db:
+                    unpartitioned_ms = time_query(db, query)
+                print(
+                    f"{history:>7}y {rows:>10,}  {name:<22} "
+                    f"{partitioned_ms[0]:>9.2f} (p95 {partitioned_ms[1]:>6.2f}) {unpartitioned_ms[0]:>9.2f} (p95 {unpartitioned_ms[1]:>6.2f})"
+                )
+    finally:
+        with engine.begin() as connection:
+            for table, column in (("expense_reports", "user_id"), ("users", "id")):
+                connection.execute(text(f"DELETE FROM {table} WHERE {column} = CAST(:user_id AS uuid)"), {"user_id": str(user_id)})
+            connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+def main() -> None:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--reports-per-month", type=int, default=10_000)
+    args = parser.parse_args()
+
+    run(args.years, args.reports_per_month)
+
+
+if __name__ == "__main__":
+    main()
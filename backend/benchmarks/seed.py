@@ -0,0 +1,109 @@
+"""Seeds the database with synthetic users and expense reports for the load benchmark.
+
+Run from the backend/ directory: python -m benchmarks.seed --users 1000 --reports 1000000
+Needs the same environment as the app and a migrated database (alembic upgrade head). Benchmark users are named
+bench-user-<n> (plus bench-admin) and all share the password BENCH_PASSWORD. Every run first deletes the data of the
+previous one, so seeding is repeatable. Reports are generated by Postgres itself (generate_series), a million take
+well under a minute.
+"""
+import argparse
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+BENCH_PASSWORD = "bench-password"
+BENCH_ADMIN = "bench-admin"
+BATCH_SIZE = 200_000
+
+BENCH_USERS = "SELECT id FROM users WHERE username LIKE 'bench-%'"
+
+INSERT_USERS = text("""
+    INSERT INTO users (id, username, email, first_name, last_name, hashed_password, is_active, role)
+    SELECT gen_random_uuid(), 'bench-user-' || n, 'bench-user-' || n || '@bench.example.com', 'Bench', n::text, :hashed_password, true, 'USER'
+    FROM generate_series(1, :users) AS n
+""")
+
+INSERT_ADMIN = text("""
+    INSERT INTO users (id, username, email, first_name, last_name, hashed_password, is_active, role)
+    VALUES (gen_random_uuid(), :username, :username || '@bench.example.com', 'Bench', 'Admin', :hashed_password, true, 'ADMIN')
+""")
+
+# Spreads the reports evenly over the users, one every 7 minutes back from now, with all three statuses
+INSERT_REPORTS = text("""
+    INSERT INTO expense_reports (user_id, title, date, amount, status, description)
+    SELECT (:user_ids)[1 + n % cardinality(:user_ids)],
+           'expense ' || n,
+           now() - n * interval '7 minutes',
+           round((random() * 500)::numeric, 2),
+           (ARRAY['PENDING', 'APPROVED', 'REJECTED'])[1 + n % 3]::expensestatus,
+           'synthetic report'
+    FROM generate_series(:start, :stop) AS n
+""").bindparams(bindparam("user_ids", type_=ARRAY(UUID)))
+
+# The rollups are normally kept current by the ExpenseReport write methods, which the seed bypasses
+INSERT_ROLLUPS = text(f"""
+    INSERT INTO expense_report_rollups (month, user_id, status, total_amount, report_count)
+    SELECT date_trunc('month', date)::date, user_id, status, sum(amount), count(*)
+    FROM expense_reports
+    WHERE user_id IN ({BENCH_USERS})
+    GROUP BY 1, 2, 3
+    ON CONFLICT (month, user_id, status) DO UPDATE SET
+        total_amount = expense_report_rollups.total_amount + excluded.total_amount,
+        report_count = expense_report_rollups.report_count + excluded.report_count
+""")
+
+
+def reset(connection) -> None:
+    """Deletes the previous benchmark data, including what the load benchmark created (reports, Google users)."""
+    for statement in (
+        f"DELETE FROM expense_report_rollups WHERE user_id IN ({BENCH_USERS})",
+        f"DELETE FROM expense_reports WHERE user_id IN ({BENCH_USERS})",
+        "DELETE FROM users WHERE username LIKE 'bench-%'",
+    ):
+        connection.execute(text(statement))
+
+
+def seed(users: int, reports: int) -> None:
+    from database import get_engine
+    from models import ListVersion, ALL_EXPENSES_SCOPE, USERS_SCOPE
+    from password_hashing import hash_password
+
+    hashed_password = hash_password(BENCH_PASSWORD)
+    started = time.perf_counter()
+
+    with get_engine().begin() as connection:
+        reset(connection)
+        connection.execute(INSERT_USERS, {"users": users, "hashed_password": hashed_password})
+        connection.execute(INSERT_ADMIN, {"username": BENCH_ADMIN, "hashed_password": hashed_password})
+        user_ids = connection.execute(text("SELECT id FROM users WHERE username LIKE 'bench-user-%'")).scalars().all()
+
+    for start in range(1, reports + 1, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE - 1, reports)
+        with get_engine().begin() as connection:
+            connection.execute(INSERT_REPORTS, {"user_ids": user_ids, "start": start, "stop": stop})
+        print(f"{stop:>12,} / {reports:,} reports ({time.perf_counter() - started:.1f} s)")
+
+    with get_engine().begin() as connection:
+        connection.execute(INSERT_ROLLUPS)
+        connection.execute(ListVersion.bump(ALL_EXPENSES_SCOPE, USERS_SCOPE))  # Invalidates the listings' ETags
+        connection.execute(text("ANALYZE users"))
+        connection.execute(text("ANALYZE expense_reports"))
+
+    print(f"seeded {users:,} users and {reports:,} reports in {time.perf_counter() - started:.1f} s")
+
+
+def main() -> None:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reports", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    seed(args.users, args.reports)
+
+
+if __name__ == "__main__":
+    main()
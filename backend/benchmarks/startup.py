@@ -0,0 +1,70 @@
+"""Cold start cost of an app worker: importing main, then building the app with create_app(), each in a fresh
+interpreter, with the -X importtime breakdown of the slowest imports.
+
+Run from the backend/ directory: python -m benchmarks.startup
+No database or other service is needed (nothing connects before the lifespan runs). Exits with status 1 when
+startup takes longer than STARTUP_BUDGET_MS, so it can guard against import-time regressions.
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 1500))
+RUNS = 5
+TOP = 15
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+SCRIPT = """
+from time import perf_counter
+started = perf_counter()
+import main
+imported = perf_counter()
+{create}
+print((imported - started) * 1000, (perf_counter() - imported) * 1000)
+"""
+
+
+def run(create: bool, importtime: bool = False) -> tuple[float, float, str]:
+    """Returns (import main ms, create_app ms, stderr) of one fresh interpreter."""
+    args = [sys.executable, *(["-X", "importtime"] if importtime else []), "-W", "ignore"]
+    script = SCRIPT.format(create="main.create_app()" if create else "")
+    result = subprocess.run([*args, "-c", script], capture_output=True, text=True, check=True)
+    import_ms, create_ms = map(float, result.stdout.split())
+    return import_ms, create_ms, result.stderr
+
+
+def slowest_imports(stderr: str) -> list[tuple[int, str]]:
+    """Cumulative time (us) of each top level package (fastapi, sqlalchemy, models...) in a -X importtime report,
+    wherever it was first imported from, slowest first. Nested packages are also counted in the ones importing them."""
+    modules = {}
+    for match in IMPORTTIME_LINE.finditer(stderr):
+        _, cumulative, _, name = match.groups()
+        if "." not in name and not name.startswith("_"):
+            modules[name] = int(cumulative)
+    return sorted(((us, name) for name, us in modules.items()), reverse=True)
+
+
+def main() -> None:
+    import_only = statistics.median(run(create=False)[0] for _ in range(RUNS))
+    startups = [run(create=True) for _ in range(RUNS)]
+    import_ms = statistics.median(s[0] for s in startups)
+    create_ms = statistics.median(s[1] for s in startups)
+    total_ms = import_ms + create_ms
+
+    print(f"import main:              {import_only:8.1f} ms")
+    print(f"import main + create_app: {total_ms:8.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+
+    print(f"\nslowest imports (-X importtime, cumulative, top {TOP}):")
+    for us, name in slowest_imports(run(create=True, importtime=True)[2])[:TOP]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    if total_ms > STARTUP_BUDGET_MS:
+        print(f"\nover budget by {total_ms - STARTUP_BUDGET_MS:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
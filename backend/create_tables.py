@@ -1,4 +1,7 @@
-from database import Base, engine
-import models
+# Kept for backwards compatibility, the schema is now managed by Alembic (see migrations/).
+# Equivalent to running `alembic upgrade head` from the backend/ directory.
+from alembic import command
+from alembic.config import Config
+import os
 
-Base.metadata.create_all(bind=engine)
+command.upgrade(Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")), "head")
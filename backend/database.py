@@ -1,13 +1,54 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, Engine, URL, make_url, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from starlette.requests import Request
+from typing import AsyncIterator
+from collections import deque
+from time import monotonic, time
 from exceptions import invalid_db_excpetion
+from db_metrics import PoolMetrics, TimedQueuePool, TimedAsyncAdaptedQueuePool, TimedNullPool
+from metrics import instrument_engine
+import threading
 import os
 
+# Pool settings, the defaults match SQLAlchemy's except pre-ping and recycle which protect against connections dropped by the server.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+# Set when DATABASE_URL points at PgBouncer in transaction mode: PgBouncer does the pooling, so we don't keep our own pool,
+# and asyncpg's prepared statement caches are turned off because they don't survive switching server connections.
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() == "true"
+
+# Optional streaming replica of DATABASE_URL, DATABASE_REPLICA_URL, for the routes that only read (read_db_dep).
+# Reads go to the primary instead while the replica lags more than REPLICA_MAX_LAG seconds or can't be reached, which is
+# checked every REPLICA_CHECK_INTERVAL seconds.
+REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", 2))
+REPLICA_CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_INTERVAL", 1))
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get("REPLICA_CONNECT_TIMEOUT", 2))
+# The lag is measured against the primary, see check_replica. WAL positions as byte offsets.
+PRIMARY_WAL_POSITION = text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')")
+# pg_stat_wal_receiver has a row while the standby's WAL receiver runs, none once it is cut off from the primary
+REPLICA_WAL_POSITION = text("SELECT pg_wal_lsn_diff(pg_last_wal_replay_lsn(), '0/0'), EXISTS (SELECT FROM pg_stat_wal_receiver)")
+# Primary positions kept to date the replica's one, a minute of checks at the default interval
+PRIMARY_POSITIONS_KEPT = 60
+
 
 def get_db_url() -> str:
     url = os.environ.get("DATABASE_URL")
     if url is None:
         raise invalid_db_excpetion
+    return normalize_db_url(url)
+
+
+def get_replica_url() -> str | None:
+    url = os.environ.get("DATABASE_REPLICA_URL")
+    return normalize_db_url(url) if url else None
+
+
+def normalize_db_url(url: str) -> str:
     if url.startswith("postgres://"):
         # SQLAlchemy requires the URL to start with postgresql://, some web hosts, like Aiven, provides it starting with postgres:// by default, so we replace it here.
         # This should introduce no issues as both are valid URLs for PostgreSQL.
@@ -15,16 +56,209 @@ def get_db_url() -> str:
     return url
 
 
-DATABASE_URL = get_db_url()
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_async_db_url() -> URL:
+    """Same database as get_db_url, but through the asyncpg driver."""
+    url = make_url(get_db_url()).set(drivername="postgresql+asyncpg")
+    if "sslmode" in url.query:
+        # asyncpg calls libpq's sslmode option ssl
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url
+
+
+def get_pool_options(for_async: bool = False) -> dict:
+    """The pools time their checkouts for PoolMetrics."""
+    if DB_PGBOUNCER:
+        return {"poolclass": TimedNullPool}
+
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if for_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# The engines are created on first use instead of at import (the app creates them in its lifespan), so modules
+# and tools like alembic or the benchmarks can be imported without DATABASE_URL set.
+_engine: Engine | None = None
+_session_factory: sessionmaker | None = None
+_read_session_factory: sessionmaker | None = None
+_pool_metrics: PoolMetrics | None = None
+
+_replica_engine: Engine | None = None
+_replica_session_factory: sessionmaker | None = None
+_replica_pool_metrics: PoolMetrics | None = None
+# replayed_until: the replica had replayed everything the primary had committed by then (a time.time()) when last checked
+_replica_status = {"available": False, "lag_seconds": None, "error": None, "replayed_until": None, "checked_at": float("-inf")}
+_primary_positions: deque[tuple[float, int]] = deque(maxlen=PRIMARY_POSITIONS_KEPT)  # (time.time(), WAL position)
+_replica_check_lock = threading.Lock()
+
+_async_engine: AsyncEngine | None = None
+_async_session_factory: async_sessionmaker | None = None
+_async_pool_metrics: PoolMetrics | None = None
+
+
+def get_engine() -> Engine:
+    global _engine, _session_factory, _read_session_factory, _pool_metrics
+    if _engine is None:
+        _engine = create_engine(get_db_url(), **get_pool_options())
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+        _read_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine.execution_options(postgresql_readonly=True))
+        _pool_metrics = PoolMetrics(_engine)
+        instrument_engine(_engine)
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Used by the async routes so database I/O doesn't block the event loop."""
+    global _async_engine, _async_session_factory, _async_pool_metrics
+    if _async_engine is None:
+        connect_args = {"statement_cache_size": 0, "prepared_statement_cache_size": 0} if DB_PGBOUNCER else {}
+        _async_engine = create_async_engine(get_async_db_url(), connect_args=connect_args, **get_pool_options(for_async=True))
+        # expire_on_commit=False because async sessions can't lazy load attributes after a commit.
+        _async_session_factory = async_sessionmaker(bind=_async_engine, autoflush=False, expire_on_commit=False)
+        _async_pool_metrics = PoolMetrics(_async_engine.sync_engine)
+        instrument_engine(_async_engine.sync_engine)
+    return _async_engine
+
+
+def get_replica_engine() -> Engine | None:
+    """The replica's engine, None if DATABASE_REPLICA_URL isn't set."""
+    global _replica_engine, _replica_session_factory, _replica_pool_metrics
+    if _replica_engine is None:
+        url = get_replica_url()
+        if url is None:
+            return None
+        _replica_engine = create_engine(url, connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT}, **get_pool_options())
+        # No postgresql_readonly here: a standby only runs read-only transactions anyway, and resetting the option when
+        # the connection returns to the pool (SET SESSION ... READ WRITE) fails during recovery.
+        _replica_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_replica_engine)
+        _replica_pool_metrics = PoolMetrics(_replica_engine)
+        instrument_engine(_replica_engine)
+    return _replica_engine
+
+
+def replica_available() -> bool:
+    """Whether reads can go to the replica. Requests arriving while it is being rechecked don't wait for the check,
+    they go by the previous one."""
+    if get_replica_engine() is None:
+        return False
+    if monotonic() - _replica_status["checked_at"] >= REPLICA_CHECK_INTERVAL and _replica_check_lock.acquire(blocking=False):
+        try:
+            check_replica()
+        finally:
+            _replica_check_lock.release()
+    return _replica_status["available"]
+
+
+def check_replica() -> None:
+    """Every check records the primary's current WAL position, then reads how far the replica has replayed. The replica
+    has everything the primary had at the newest recorded position it has reached, its lag is the time since then: an
+    idle primary doesn't advance, so a replica that replayed all of it has no lag. A standby whose WAL receiver isn't
+    running gets nothing new from the primary however small its lag looks, it isn't available."""
+    try:
+        with get_engine().connect() as connection:
+            _primary_positions.append((time(), int(connection.scalar(PRIMARY_WAL_POSITION))))
+        with _replica_engine.connect() as connection:
+            replayed, receiving = connection.execute(REPLICA_WAL_POSITION).one()
+
+        _replica_status.update(replica_lag(replayed, receiving))
+    except SQLAlchemyError as e:
+        _replica_status.update(available=False, lag_seconds=None, replayed_until=None, error=repr(e))
+    _replica_status["checked_at"] = monotonic()
+
+
+def replica_lag(replayed: int | None, receiving: bool) -> dict:
+    if replayed is None:
+        return {"available": False, "lag_seconds": None, "replayed_until": None, "error": "Not a standby."}
+
+    replayed_until = next((at for at, position in reversed(_primary_positions) if position <= replayed), None)
+    lag = None if replayed_until is None else time() - replayed_until  # None when behind every recorded position
+    if not receiving:
+        return {"available": False, "lag_seconds": lag, "replayed_until": replayed_until, "error": "WAL receiver isn't running."}
+    return {"available": lag is not None and lag <= REPLICA_MAX_LAG, "lag_seconds": lag, "replayed_until": replayed_until, "error": None}
+
+
+def replica_has_replayed(written_at: float) -> bool:
+    """Whether the replica had what the primary committed by written_at (a time.time()) when it was last checked."""
+    replayed_until = _replica_status["replayed_until"]
+    return replayed_until is not None and written_at <= replayed_until
+
+
+def get_replica_status() -> dict | None:
+    if get_replica_engine() is None:
+        return None
+    status = {key: value for key, value in _replica_status.items() if key not in ("checked_at", "replayed_until")}
+    return {**status, "pool": _replica_pool_metrics.snapshot()}
+
+
+def new_session() -> Session:
+    get_engine()
+    return _session_factory()
+
+
+def new_read_session(prefer_primary: bool = False) -> Session:
+    """Session on the replica when it is available (see replica_available) unless prefer_primary, otherwise in
+    read-only transactions on the primary. db.info["replica"] tells which."""
+    replica = not prefer_primary and replica_available()
+    if replica:
+        db = _replica_session_factory()
+    else:
+        get_engine()
+        db = _read_session_factory()
+    db.info["replica"] = replica
+    return db
+
+
+def new_async_session() -> AsyncSession:
+    get_async_engine()
+    return _async_session_factory()
+
+
+def get_pool_metrics() -> PoolMetrics:
+    get_engine()
+    return _pool_metrics
+
+
+def get_async_pool_metrics() -> PoolMetrics:
+    get_async_engine()
+    return _async_pool_metrics
+
+
+async def dispose_engines() -> None:
+    """Closes the pooled connections of whichever engines were created, on app shutdown."""
+    if _engine is not None:
+        _engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _replica_engine is not None:
+        _replica_engine.dispose()
+
 
 Base = declarative_base()
 
 
 def get_db():
-    db = SessionLocal()
+    db = new_session()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    """get_db for routes that only read, see new_read_session. Users who just wrote something read from the primary
+    (utils.ReadYourWritesMiddleware sets request.state.read_primary), so they see their change even before the replica
+    has it."""
+    db = new_read_session(prefer_primary=getattr(request.state, "read_primary", False))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with new_async_session() as db:
+        yield db
@@ -0,0 +1,100 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
+from time import perf_counter
+import threading
+
+
+class Timing:
+    """Running count/sum/max of durations in seconds. Cheap enough to update on every connection checkout."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_seconds": self.total,
+                "avg_seconds": self.total / self.count if self.count else 0.0,
+                "max_seconds": self.max,
+            }
+
+
+class TimedCheckout:
+    """Pool mixin timing every checkout, waiting for a free connection and opening a new one included, into
+    checkout_wait. The pool events only fire once a connection has been checked out, they can't see the wait."""
+    checkout_wait: Timing | None = None  # Set by PoolMetrics
+
+    def connect(self):
+        started = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            if self.checkout_wait is not None:
+                self.checkout_wait.observe(perf_counter() - started)
+
+    def recreate(self):
+        # Engine.dispose replaces the pool with a new one
+        pool = super().recreate()
+        pool.checkout_wait = self.checkout_wait
+        return pool
+
+
+class TimedQueuePool(TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+class TimedNullPool(TimedCheckout, NullPool):
+    pass
+
+
+class PoolMetrics:
+    """Connection pool instrumentation for one engine.
+
+    checkout_wait is recorded by the pool when it is a TimedCheckout one, for every checkout, so sessions can connect
+    lazily; connection_hold by pool events from checkout until the connection is returned to the pool."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.checkout_wait = Timing()
+        self.connection_hold = Timing()
+
+        if isinstance(engine.pool, TimedCheckout):
+            engine.pool.checkout_wait = self.checkout_wait
+
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+
+    @staticmethod
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info["checked_out_at"] = perf_counter()
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            self.connection_hold.observe(perf_counter() - checked_out_at)
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        stats = {"pool_class": type(pool).__name__}
+
+        # Only QueuePool (and its asyncio adaptation) keeps connections, NullPool in PgBouncer mode has nothing to report.
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=pool.overflow())
+
+        stats.update(checkout_wait=self.checkout_wait.snapshot(), connection_hold=self.connection_hold.snapshot())
+        return stats
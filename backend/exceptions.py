@@ -7,12 +7,28 @@ invalid_db_excpetion = ValueError("DATABASE_URL is not set")
 user_exists_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this email or username already exists.")
 auth_failed_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
 invalid_token_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+password_pool_busy_exception = HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many login attempts right now, please retry shortly.",
+                                             headers={"Retry-After": "1"})
+
+
+def rate_limited_exception(retry_after: int) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests, please retry later.",
+                         headers={"Retry-After": str(retry_after)})
+
 
 # Expense reports exceptions
 invalid_expense_status_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid expense status.")
 invalid_expense_update_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only pending expense reports can be modified.")
 bad_expense_access_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                              detail="Expense report doesn't exist or you are not authorized to access it.")
+invalid_import_file_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Import file must be a UTF-8 CSV file or a JSON array of objects.")
+import_too_large_exception = HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail="Import file has too many rows.")
+
+
+def bulk_selection_too_large_exception(limit: int) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                         detail=f"The filters select more than {limit} reports, narrow them down or update them by ids.")
+
 
 # Admin exceptions
 not_admin_exception = HTTPException(status_code=status.HTTP_403_FORBIDDEN,
@@ -20,5 +36,13 @@ not_admin_exception = HTTPException(status_code=status.HTTP_403_FORBIDDEN,
 user_not_found_exception = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
 change_own_role_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You cannot change your own role.")
 
+# File exceptions
+file_too_large_exception = HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail="File is too large.")
+unsupported_file_type_exception = HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                                detail="Unsupported file type. Upload a JPEG, PNG, GIF, WebP or HEIC image, or a PDF.")
+
+# Pagination exceptions
+invalid_cursor_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+
 # General exceptions
 internal_server_exception = HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal server error.")
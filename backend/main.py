@@ -1,40 +1,105 @@
 from fastapi import FastAPI, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from services import auth_router, expenses_router, admin_router, configure_cloudinary
-from utils import verify_admin
+from contextlib import asynccontextmanager, suppress
 from dotenv import load_dotenv
+import asyncio
 import os
 
-load_dotenv()
 
-CLOUDINARY_URL = os.getenv("CLOUDINARY_URL")
-configure_cloudinary(CLOUDINARY_URL)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from database import get_engine, get_async_engine, dispose_engines
+    from services import run_deletion_worker, run_partition_maintenance, report_events
+    from utils import shutdown_password_pool
 
-app = FastAPI(title="expense reports API")
+    # Creating the engines doesn't connect yet, it only saves the first requests from doing it
+    get_engine()
+    get_async_engine()
 
-origins = ["http://localhost:5173", "http://localhost:8000"]
+    # Every app process drains the file deletion queue, set FILE_DELETION_WORKER=false to leave it to other processes.
+    worker = None
+    if os.getenv("FILE_DELETION_WORKER", "true").lower() == "true":
+        worker = asyncio.create_task(run_deletion_worker())
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_headers=["*"],
-    allow_methods=["*"],
-)
+    # Creates the coming months' expense_reports partitions and archives closed months, see services/expenses/partitions.py.
+    # Concurrent runs of several processes are harmless, set EXPENSE_PARTITION_MAINTENANCE=false to leave it to a cron job.
+    partition_maintenance = None
+    if os.getenv("EXPENSE_PARTITION_MAINTENANCE", "true").lower() == "true":
+        partition_maintenance = asyncio.create_task(run_partition_maintenance())
 
-# To enable session management for OAuth
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=os.getenv("SESSION_SECRET_KEY"),
-)
+    yield
 
-app.include_router(auth_router, prefix="/auth", tags=["Auth"])
-app.include_router(expenses_router, prefix="/reports", tags=["Expense Reports"])
-app.include_router(admin_router, prefix="/admin", tags=["Admin Dashboard"], dependencies=[Depends(verify_admin)])
+    for task in (worker, partition_maintenance):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
 
+    await report_events.close()
+    shutdown_password_pool()
+    await dispose_engines()
 
-@app.get("/")
-def read_root():
-    return JSONResponse(content={"message": "Welcome to the expense reports api this message from the backend :)"})
+
+def create_app() -> FastAPI:
+    """Builds the app, run it with `uvicorn main:create_app --factory`.
+
+    Importing this module does no work. The app's modules are imported here, after .env is loaded, since they read
+    their settings from the environment when imported. Database engines are created in the lifespan, and the
+    Cloudinary SDK, the Google OAuth client and bcrypt are set up on first use."""
+    load_dotenv()
+
+    from fastapi.staticfiles import StaticFiles
+    from services import auth_router, expenses_router, admin_router, configure_storage, UploadSizeLimitMiddleware, LocalStorage
+    from utils import verify_admin, ReadYourWritesMiddleware
+    from metrics import MetricsMiddleware, render_metrics
+
+    storage = configure_storage()
+
+    app = FastAPI(title="expense reports API", lifespan=lifespan)
+
+    origins = ["http://localhost:5173", "http://localhost:8000"]
+
+    # Refuse oversized uploads before their body is read. Added before CORSMiddleware, which then wraps it: the 413
+    # gets the CORS headers and the frontend can read it.
+    app.add_middleware(UploadSizeLimitMiddleware)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_headers=["*"],
+        allow_methods=["*"],
+    )
+
+    # To enable session management for OAuth
+    app.add_middleware(
+        SessionMiddleware,
+        secret_key=os.getenv("SESSION_SECRET_KEY"),
+    )
+
+    # Sends a user's reads to the primary right after their writes, when reads may go to a replica
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    # Outermost, so the latency it records covers the other middlewares too
+    app.add_middleware(MetricsMiddleware)
+
+    app.include_router(auth_router, prefix="/auth", tags=["Auth"])
+    app.include_router(expenses_router, prefix="/reports", tags=["Expense Reports"])
+    app.include_router(admin_router, prefix="/admin", tags=["Admin Dashboard"], dependencies=[Depends(verify_admin)])
+
+    # Files of the local storage backend (STORAGE_BACKEND=local) are served by the app itself
+    if isinstance(storage, LocalStorage):
+        app.mount("/files", StaticFiles(directory=storage.directory), name="files")
+
+    @app.get("/")
+    def read_root():
+        return JSONResponse(content={"message": "Welcome to the expense reports api this message from the backend :)"})
+
+    @app.get("/metrics", dependencies=[Depends(verify_admin)], include_in_schema=False)
+    def read_metrics():
+        """Prometheus scrape endpoint, the scraper authenticates with an admin access token (bearer_token)."""
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    return app
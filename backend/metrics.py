@@ -0,0 +1,202 @@
+"""Request level metrics in the Prometheus text format, served by GET /metrics.
+
+MetricsMiddleware times every request and, through a context variable, collects the SQL statements (engine events
+installed by instrument_engine) and storage calls made for it, so per route latency can be split between the database,
+storage and the app itself. Statements slower than SLOW_QUERY_MS are logged to the "sql.slow" logger.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from contextvars import ContextVar
+from dataclasses import dataclass
+from bisect import bisect_left
+from time import perf_counter
+import threading
+import hashlib
+import logging
+import os
+
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_MS", 250)) / 1000
+
+slow_query_logger = logging.getLogger("sql.slow")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Histogram:
+    """Prometheus histogram with one series per combination of label values."""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label values -> [observations per bucket (the last one is +Inf), sum]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(label_values, list(counts), total) for label_values, (counts, total) in self._series.items()]
+
+        for label_values, counts, total in sorted(series):
+            labels = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self) -> None:
+        with self._lock:
+            self.value += 1
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+
+def escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+ROUTE_LABELS = ("method", "route", "status")
+
+request_duration = Histogram("http_request_duration_seconds", "Request latency.", ROUTE_LABELS, LATENCY_BUCKETS)
+request_sql_statements = Histogram("http_request_sql_statements", "SQL statements run per request.", ROUTE_LABELS, COUNT_BUCKETS)
+request_sql_duration = Histogram("http_request_sql_duration_seconds", "Time spent in SQL statements per request.", ROUTE_LABELS, LATENCY_BUCKETS)
+request_storage_duration = Histogram("http_request_storage_duration_seconds", "Time spent in storage calls per request.", ROUTE_LABELS, LATENCY_BUCKETS)
+sql_duration = Histogram("db_statement_duration_seconds", "Duration of every SQL statement, in or outside requests.", (), LATENCY_BUCKETS)
+slow_queries = Counter("db_slow_statements_total", "SQL statements slower than SLOW_QUERY_MS.")
+storage_call_duration = Histogram("storage_call_duration_seconds", "Storage backend calls.", ("backend", "operation"), LATENCY_BUCKETS)
+
+REGISTRY = (request_duration, request_sql_statements, request_sql_duration, request_storage_duration, sql_duration, slow_queries, storage_call_duration)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+@dataclass
+class RequestStats:
+    sql_statements: int = 0
+    sql_seconds: float = 0.0
+    storage_seconds: float = 0.0
+
+
+# Stats of the request being handled. Threadpool calls copy the context, so they update the same RequestStats.
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def fingerprint(statement: str, parameters) -> tuple[str, str]:
+    """A short hash of the normalized statement, to group its occurrences, and the names and types of its bound
+    parameters. Parameter values are left out of the logs, they can hold personal data."""
+    normalized = " ".join(statement.split())
+    digest = hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        rows, parameters = len(parameters), parameters[0]  # executemany, the first row stands for all
+    else:
+        rows = 1
+
+    if isinstance(parameters, dict):
+        types = ", ".join(f"{name}: {type(value).__name__}" for name, value in parameters.items())
+    else:
+        types = ", ".join(type(value).__name__ for value in parameters or ())
+    return digest, f"({types})" + (f" x {rows} rows" if rows > 1 else "")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info["statement_started_at"] = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info.pop("statement_started_at", None)
+    if started is None:
+        return
+    elapsed = perf_counter() - started
+    sql_duration.observe(elapsed)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.sql_statements += 1
+        stats.sql_seconds += elapsed
+
+    if elapsed >= SLOW_QUERY_SECONDS:
+        slow_queries.inc()
+        digest, parameter_types = fingerprint(statement, parameters)
+        slow_query_logger.warning("%.1f ms [%s] %s params %s", elapsed * 1000, digest, " ".join(statement.split()), parameter_types)
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def observe_storage_call(backend: str, operation: str, seconds: float) -> None:
+    storage_call_duration.observe(seconds, backend, operation)
+    stats = current_request.get()
+    if stats is not None:
+        stats.storage_seconds += seconds
+
+
+def route_label(scope: Scope) -> str:
+    # The route's path template, not the actual path, to keep one series per route (and one for all unmatched paths).
+    # Routes of included routers keep their own path in scope["route"], without the router's prefix; FastAPI records
+    # the full template in the effective route context it selected.
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    return getattr(context, "path_format", None) or getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - started
+            current_request.reset(token)
+
+            labels = (scope["method"], route_label(scope), str(status))
+            request_duration.observe(elapsed, *labels)
+            request_sql_statements.observe(stats.sql_statements, *labels)
+            request_sql_duration.observe(stats.sql_seconds, *labels)
+            request_storage_duration.observe(stats.storage_seconds, *labels)
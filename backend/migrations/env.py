@@ -0,0 +1,36 @@
+from logging.config import fileConfig
+from alembic import context
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import Base, get_db_url, get_engine  # noqa: E402
+import models  # noqa: E402, F401
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Emit the SQL to stdout instead of running it (`alembic upgrade head --sql`)."""
+    context.configure(url=get_db_url(), target_metadata=target_metadata, literal_binds=True)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with get_engine().connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
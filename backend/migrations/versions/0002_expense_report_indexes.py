@@ -0,0 +1,34 @@
+"""Composite indexes for the per-user and admin report listings.
+
+(user_id, date) serves GET /reports, (status, date) the admin status filter and (date, id) the keyset pagination of
+GET /admin/reports. Built concurrently so the migration doesn't lock expense_reports against writes on large tables.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_expense_reports_user_id_date": ["user_id", "date"],
+    "ix_expense_reports_status_date": ["status", "date"],
+    "ix_expense_reports_date_id": ["date", "id"],
+}
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.create_index(name, "expense_reports", columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(name, table_name="expense_reports", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,37 @@
+"""Rollup table of expense report totals per (month, user, status), backfilled from expense_reports.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "expense_report_rollups",
+        sa.Column("month", sa.Date(), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("status", postgresql.ENUM(name="expensestatus", create_type=False), primary_key=True),
+        sa.Column("total_amount", sa.Float(), nullable=False),
+        sa.Column("report_count", sa.Integer(), nullable=False),
+    )
+    op.execute(
+        """
+        INSERT INTO expense_report_rollups (month, user_id, status, total_amount, report_count)
+        SELECT date_trunc('month', date)::date, user_id, status, sum(amount), count(*)
+        FROM expense_reports
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("expense_report_rollups")
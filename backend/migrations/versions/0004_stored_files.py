@@ -0,0 +1,28 @@
+"""Content-addressed registry of uploaded files with reference counts.
+
+Files uploaded before this migration aren't tracked and are deleted as before when replaced.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stored_files",
+        sa.Column("content_hash", sa.String(64), primary_key=True),
+        sa.Column("url", sa.String(), nullable=False, unique=True),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("stored_files")
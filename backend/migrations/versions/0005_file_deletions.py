@@ -0,0 +1,31 @@
+"""Durable queue of files to delete from storage.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "file_deletions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("url", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_file_deletions_next_attempt_at", "file_deletions", ["next_attempt_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_file_deletions_next_attempt_at", table_name="file_deletions")
+    op.drop_table("file_deletions")
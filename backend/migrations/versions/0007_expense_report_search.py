@@ -0,0 +1,45 @@
+"""Full-text and trigram search over expense report titles and descriptions.
+
+search_vector is a stored generated column (title weighted above description) with a GIN index for full-text queries.
+The trigram GIN index on title and description serves the partial (ILIKE) matches. Adding a stored generated column
+rewrites expense_reports under an exclusive lock, run this migration in a maintenance window on large tables.
+The indexes are then built concurrently.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        """
+        ALTER TABLE expense_reports ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+        """
+    )
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_expense_reports_search_vector ON expense_reports USING gin (search_vector)")
+        op.execute(
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_expense_reports_search_trgm
+            ON expense_reports USING gin ((title || ' ' || coalesce(description, '')) gin_trgm_ops)
+            """
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_expense_reports_search_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_expense_reports_search_vector")
+    op.execute("ALTER TABLE expense_reports DROP COLUMN search_vector")
@@ -0,0 +1,106 @@
+"""Partitions expense_reports by month of date.
+
+The table is rebuilt as a declarative range partitioned one: a partition per month from the oldest report's through
+the months ahead (expense_reports_y2026m10 covers October 2026), the cold expense_reports_archive partition for
+everything older, empty until closed months are archived into it, and expense_reports_default for reports dated
+outside all of them. New months and the archival are then handled by services/expenses/partitions.py.
+
+The primary key becomes (id, date), a unique constraint on a partitioned table has to include the partition key;
+ids still come from expense_reports_id_seq. Copying the reports rewrites the whole table and rebuilds its indexes
+under an exclusive lock, run this migration in a maintenance window.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+from datetime import datetime
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, user_id, title, date, amount, status, admin_comment, description, file"
+
+CREATE_TABLE = """
+    CREATE TABLE expense_reports (
+        id integer NOT NULL DEFAULT nextval('expense_reports_id_seq'),
+        user_id uuid NOT NULL REFERENCES users (id),
+        title varchar NOT NULL,
+        date timestamp NOT NULL,
+        amount double precision NOT NULL,
+        status expensestatus NOT NULL,
+        admin_comment varchar,
+        description varchar,
+        file varchar,
+        search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED,
+        PRIMARY KEY ({primary_key})
+    ) {partition_by}
+"""
+
+INDEXES = (
+    "CREATE INDEX ix_expense_reports_id ON expense_reports (id)",
+    "CREATE INDEX ix_expense_reports_user_id_date ON expense_reports (user_id, date)",
+    "CREATE INDEX ix_expense_reports_status_date ON expense_reports (status, date)",
+    "CREATE INDEX ix_expense_reports_date_id ON expense_reports (date, id)",
+    "CREATE INDEX ix_expense_reports_search_vector ON expense_reports USING gin (search_vector)",
+    "CREATE INDEX ix_expense_reports_search_trgm ON expense_reports USING gin ((title || ' ' || coalesce(description, '')) gin_trgm_ops)",
+)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def rename_previous_table() -> None:
+    """Frees the names of expense_reports, its indexes and sequence for the new table, the old one is dropped once copied."""
+    op.execute("ALTER TABLE expense_reports RENAME TO expense_reports_previous")
+    op.execute("ALTER INDEX expense_reports_pkey RENAME TO expense_reports_previous_pkey")
+    for statement in INDEXES:
+        name = statement.split()[2]
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    # The sequence would be dropped along with the table owning it
+    op.execute("ALTER SEQUENCE expense_reports_id_seq OWNED BY NONE")
+
+
+def copy_previous_table() -> None:
+    op.execute(f"INSERT INTO expense_reports ({COLUMNS}) SELECT {COLUMNS} FROM expense_reports_previous")
+    op.execute("DROP TABLE expense_reports_previous")
+    op.execute("ALTER SEQUENCE expense_reports_id_seq OWNED BY expense_reports.id")
+    # Created after the copy, building an index at once is faster than maintaining it row by row
+    for statement in INDEXES:
+        op.execute(statement)
+    op.execute("ANALYZE expense_reports")
+
+
+def upgrade() -> None:
+    oldest = op.get_bind().scalar(sa.text("SELECT date_trunc('month', min(date)) FROM expense_reports"))
+    current = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    first = min(oldest or current, current)
+
+    rename_previous_table()
+    op.execute(CREATE_TABLE.format(primary_key="id, date", partition_by="PARTITION BY RANGE (date)"))
+
+    op.execute(f"CREATE TABLE expense_reports_archive PARTITION OF expense_reports FOR VALUES FROM (MINVALUE) TO ('{first}')")
+    month = first
+    while month <= add_months(current, MONTHS_AHEAD):
+        end = add_months(month, 1)
+        op.execute(f"CREATE TABLE expense_reports_y{month.year}m{month.month:02d} PARTITION OF expense_reports FOR VALUES FROM ('{month}') TO ('{end}')")
+        month = end
+    op.execute("CREATE TABLE expense_reports_default PARTITION OF expense_reports DEFAULT")
+
+    copy_previous_table()
+
+
+def downgrade() -> None:
+    rename_previous_table()
+    op.execute(CREATE_TABLE.format(primary_key="id", partition_by=""))
+    # The partitions go with their parent
+    copy_previous_table()
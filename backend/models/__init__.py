@@ -1,2 +1,5 @@
 from .user_models import User
-from .expense_models import ExpenseReport
+from .expense_models import ExpenseReport, STATUS_EVENTS_CHANNEL
+from .rollup_models import ExpenseReportRollup
+from .file_models import StoredFile, FileDeletion
+from .version_models import ListVersion, ALL_EXPENSES_SCOPE, USERS_SCOPE, user_expenses_scope
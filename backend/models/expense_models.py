@@ -1,22 +1,44 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, extract, Enum
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Index, Row, ColumnElement, insert, select, update, tuple_, cast, case, func, or_, literal_column, Computed, REAL, TextClause, text, bindparam
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR, ARRAY
+from sqlalchemy.orm import relationship, deferred, Session, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from fastapi import BackgroundTasks
-from typing import Self
+from typing import Self, Iterator
 from database import Base
-from schema import ExpenseCreate, ExpenseRetrieve, ExpenseUpdate, ExpenseStatus
+from schema import ExpenseCreate, ExpenseRetrieve, ExpenseUpdate, ExpenseStatus, ExpenseFilter, ExpensePage, expense_list_adapter, month_range, EmployeeSummary, ExpenseWithEmployee, ExpenseWithEmployeePage, expense_with_employee_list_adapter, ExpenseBulkUpdateStatus, ExpenseBulkItemResult, ExpenseBulkUpdateResult, ExpenseStatusEvent, MAX_BULK_IDS
+from utils import encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor
 from datetime import datetime
-from exceptions import invalid_expense_status_exception, internal_server_exception, bad_expense_access_exception, invalid_expense_update_exception
+from .rollup_models import ExpenseReportRollup
+from .file_models import FileDeletion
+from .version_models import ListVersion, ALL_EXPENSES_SCOPE, user_expenses_scope
+from exceptions import invalid_expense_status_exception, internal_server_exception, bad_expense_access_exception, invalid_expense_update_exception, bulk_selection_too_large_exception
+
+# Shorter search terms have no trigram to look up in the index, they only match whole words
+TRIGRAM_MIN_LENGTH = 3
+
+# Status changes are announced on this channel, see services/expenses/events.py
+STATUS_EVENTS_CHANNEL = "expense_status"
+# NOTIFY payloads are limited to 8000 bytes, comments are cut to this many characters (up to 4 bytes each)
+MAX_EVENT_COMMENT_LENGTH = 1000
+
+NOTIFY_STATUS_EVENTS = text("SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload").bindparams(
+    bindparam("payloads", type_=ARRAY(String)),
+)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
 class ExpenseReport(Base):
     __tablename__ = 'expense_reports'
 
-    id = Column(Integer, primary_key=True, index=True)
+    # The primary key includes date, the partition key (see services/expenses/partitions.py). Updates and deletes of
+    # loaded reports then name their partition, lookups by id alone check every partition's id index.
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(UUID, ForeignKey('users.id'), nullable=False)
     title = Column(String, nullable=False)
-    date = Column(DateTime, nullable=False)
+    date = Column(DateTime, primary_key=True)
     amount = Column(Float, nullable=False)
     status = Column(Enum(ExpenseStatus), nullable=False, default=ExpenseStatus.PENDING)
 
@@ -24,11 +46,71 @@ class ExpenseReport(Base):
     description = Column(String, nullable=True)
     file = Column(String, nullable=True)
 
+    # Maintained by Postgres, see search_expenses. Deferred, entities never need it.
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        persisted=True,
+    )))
+
     # Python relationships
     user = relationship("User", back_populates="expense_reports")
 
+    # Composite indexes, keep in sync with the migrations in migrations/versions/
+    __table_args__ = (
+        Index("ix_expense_reports_user_id_date", "user_id", "date"),
+        Index("ix_expense_reports_status_date", "status", "date"),
+        Index("ix_expense_reports_date_id", "date", "id"),
+        Index("ix_expense_reports_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_expense_reports_search_trgm",
+            (title + literal_column("' '") + func.coalesce(description, literal_column("''"))).label("search_text"),
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+
+    # Don't fetch search_vector back (INSERT ... RETURNING) after every write
+    __mapper_args__ = {"eager_defaults": False}
+
+    @classmethod
+    def retrieve_columns(cls) -> list[ColumnElement]:
+        """The columns of ExpenseRetrieve in field order, so list queries can select plain rows for
+        validate_rows instead of hydrating full entities."""
+        # user_id as text, the adapter parses it anyway and the driver would first build a uuid.UUID per row. status as
+        # its value rather than the stored name, which SQLAlchemy would map to the enum member row by row.
+        columns = {
+            "user_id": cast(cls.user_id, String),
+            "status": case({status.name: status.value for status in ExpenseStatus}, value=cast(cls.status, String)).label("status"),
+        }
+        return [columns.get(field, getattr(cls, field)) for field in ExpenseRetrieve.model_fields]
+
+    @classmethod
+    def validate_rows(cls, rows: list[Row]) -> list[ExpenseRetrieve]:
+        """Validates rows selected with retrieve_columns in a single TypeAdapter call."""
+        fields = ExpenseRetrieve.model_fields.keys()
+        return expense_list_adapter.validate_python([dict(zip(fields, row)) for row in rows])
+
+    @classmethod
+    def employee_columns(cls) -> list[ColumnElement]:
+        """The columns of EmployeeSummary in field order, selected from users joined on user_id."""
+        from .user_models import User
+
+        full_name = func.nullif(func.concat_ws(" ", User.first_name, User.last_name), "")
+        return [User.username.label("employee_username"), full_name.label("employee_full_name"), User.avatar.label("employee_avatar")]
+
+    @classmethod
+    def validate_rows_with_employee(cls, rows: list[Row]) -> list[ExpenseWithEmployee]:
+        """Validates rows selected with retrieve_columns followed by employee_columns in a single TypeAdapter call."""
+        fields = ExpenseRetrieve.model_fields.keys()
+        employee_fields = EmployeeSummary.model_fields.keys()
+        offset = len(fields)
+        return expense_with_employee_list_adapter.validate_python(
+            [{**dict(zip(fields, row)), "employee": dict(zip(employee_fields, row[offset:]))} for row in rows]
+        )
+
     @classmethod
-    def create(cls, db: Session, expense_create: ExpenseCreate, user_id: UUID, date: datetime, status: str) -> ExpenseRetrieve:
+    async def create(cls, db: AsyncSession, expense_create: ExpenseCreate, user_id: UUID, date: datetime, status: str) -> ExpenseRetrieve:
         if status not in ["Pending", "Approved", "Rejected"]:
             raise invalid_expense_status_exception
 
@@ -36,42 +118,74 @@ class ExpenseReport(Base):
 
         try:
             db.add(expense_report)
-            db.commit()
-            db.refresh(expense_report)
+            await db.execute(ExpenseReportRollup.delta(user_id, date, status, expense_report.amount, 1))
+            await db.execute(ListVersion.bump(user_expenses_scope(user_id), ALL_EXPENSES_SCOPE))
+            # The session doesn't expire on commit and the id is set by the INSERT, so no refresh round trip is needed.
+            await db.commit()
             return ExpenseRetrieve.model_validate(expense_report)
         except SQLAlchemyError:
-            db.rollback()
+            await db.rollback()
             raise internal_server_exception
 
     @classmethod
-    def get_user_expenses(cls, db: Session, user_id: UUID) -> list[ExpenseRetrieve]:
+    async def bulk_create(cls, db: AsyncSession, expenses: list[ExpenseCreate], user_id: UUID, date: datetime, status: str) -> list[int]:
+        """Inserts all expenses with batched multi-row INSERT ... RETURNING statements and a single commit. Returns the new ids in order."""
+        if status not in ["Pending", "Approved", "Rejected"]:
+            raise invalid_expense_status_exception
+
+        rows = [{**expense.model_dump(), "user_id": user_id, "date": date, "status": status} for expense in expenses]
+
+        try:
+            result = await db.execute(insert(cls).returning(cls.id, sort_by_parameter_order=True), rows)
+            ids = result.scalars().all()
+            await db.execute(ExpenseReportRollup.deltas([(user_id, date, status, sum(row["amount"] for row in rows), len(rows))]))
+            await db.execute(ListVersion.bump(user_expenses_scope(user_id), ALL_EXPENSES_SCOPE))
+            await db.commit()
+            return ids
+        except SQLAlchemyError:
+            await db.rollback()
+            raise internal_server_exception
+
+    @classmethod
+    def get_user_expenses(cls, db: Session, user_id: UUID) -> list[dict]:
+        """All of the user's reports newest first, as rows for expense_row_list_adapter. They aren't validated as
+        ExpenseRetrieve: the database typed them already, and validating took more CPU than the rest of the response."""
+        fields = ExpenseRetrieve.model_fields.keys()
         try:
-            expenses = db.query(cls).filter(cls.user_id == user_id).all()
-            return [ExpenseRetrieve.model_validate(expense) for expense in expenses]
+            rows = db.execute(select(*cls.retrieve_columns()).where(cls.user_id == user_id).order_by(cls.date.desc()))
+            return [dict(zip(fields, row)) for row in rows]
         except SQLAlchemyError:
             raise internal_server_exception
 
     @classmethod
-    def update_user_expense(cls, expense: Self, db: Session, expense_update: ExpenseUpdate) -> ExpenseRetrieve:
+    async def update_user_expense(cls, expense: Self, db: AsyncSession, expense_update: ExpenseUpdate) -> ExpenseRetrieve:
         try:
             if expense.status != "Pending":
                 raise invalid_expense_update_exception
 
+            old_amount, old_file = expense.amount, expense.file
             to_update = expense_update.model_dump(exclude_none=True, exclude_unset=True)
             for key, value in to_update.items():
                 setattr(expense, key, value)
 
-            db.commit()
-            db.refresh(expense)
+            if expense.amount != old_amount:
+                await db.execute(ExpenseReportRollup.delta(expense.user_id, expense.date, expense.status, expense.amount - old_amount, 0))
+
+            # Drops the replaced file's reference, the file itself is only deleted if nothing else uses it.
+            if old_file and to_update.get("file"):
+                db.add(FileDeletion(url=old_file))
+
+            await db.execute(ListVersion.bump(user_expenses_scope(expense.user_id), ALL_EXPENSES_SCOPE))
+            await db.commit()
             return ExpenseRetrieve.model_validate(expense)
         except SQLAlchemyError:
-            db.rollback()
+            await db.rollback()
             raise internal_server_exception
 
     @classmethod
-    def check_user_expense_update_auth(cls, db: Session, user_id: UUID, expense_id: int) -> Self:
+    async def check_user_expense_update_auth(cls, db: AsyncSession, user_id: UUID, expense_id: int) -> Self:
         try:
-            expense = db.query(cls).filter(cls.user_id == user_id, cls.id == expense_id).first()
+            expense = await db.scalar(select(cls).where(cls.user_id == user_id, cls.id == expense_id))
             if not expense:
                 raise bad_expense_access_exception
             if expense.status != ExpenseStatus.PENDING:
@@ -81,9 +195,7 @@ class ExpenseReport(Base):
             raise internal_server_exception
 
     @classmethod
-    def delete_user_expense(cls, db: Session, user_id: UUID, expense_id: int, background_tasks: BackgroundTasks) -> None:
-        from services.files_service import delete_file_by_url
-
+    def delete_user_expense(cls, db: Session, user_id: UUID, expense_id: int) -> None:
         try:
             expense = db.query(cls).filter(cls.user_id == user_id, cls.id == expense_id).first()
             if not expense:
@@ -93,30 +205,148 @@ class ExpenseReport(Base):
                 raise invalid_expense_update_exception
 
             if expense.file:
-                background_tasks.add_task(delete_file_by_url, expense.file)
+                db.add(FileDeletion(url=expense.file))
 
             db.delete(expense)
+            db.execute(ExpenseReportRollup.delta(expense.user_id, expense.date, expense.status, -expense.amount, -1))
+            db.execute(ListVersion.bump(user_expenses_scope(expense.user_id), ALL_EXPENSES_SCOPE))
             db.commit()
         except SQLAlchemyError:
             db.rollback()
             raise internal_server_exception
 
     @classmethod
-    def get_all_expenses(cls, db: Session, user: UUID, month: int) -> list[ExpenseRetrieve]:
+    def filter_conditions(cls, filters: ExpenseFilter) -> list[ColumnElement[bool]]:
+        conditions = []
+        if filters.user_id is not None:
+            conditions.append(cls.user_id == filters.user_id)
+
+        if filters.status is not None:
+            conditions.append(cls.status == filters.status)
+
+        if filters.min_amount is not None:
+            conditions.append(cls.amount >= filters.min_amount)
+
+        if filters.max_amount is not None:
+            conditions.append(cls.amount <= filters.max_amount)
+
+        if filters.date_from is not None:
+            conditions.append(cls.date >= filters.date_from)
+
+        if filters.date_to is not None:
+            conditions.append(cls.date < filters.date_to)
+
+        if filters.month > 0:
+            # A plain range on the column (instead of extract("month", ...)) lets Postgres use the date indexes.
+            month_start, month_end = month_range(filters.year or datetime.now().year, filters.month)
+            conditions.extend([cls.date >= month_start, cls.date < month_end])
+
+        return conditions
+
+    @classmethod
+    def filter_query(cls, q: Query, filters: ExpenseFilter) -> Query:
+        return q.filter(*cls.filter_conditions(filters))
+
+    @classmethod
+    def get_all_expenses(
+            cls, db: Session, filters: ExpenseFilter, limit: int, cursor: str | None = None, with_employee: bool = False
+    ) -> ExpensePage | ExpenseWithEmployeePage:
+        """Newest first, keyset-paginated on (date, id). Pass the returned next_cursor to get the following page.
+        with_employee embeds each report's employee summary, selected through a join in the same query."""
+        if with_employee:
+            from .user_models import User
+
+            q = db.query(*cls.retrieve_columns(), *cls.employee_columns()).join(User, User.id == cls.user_id)
+        else:
+            q = db.query(*cls.retrieve_columns())
+        q = cls.filter_query(q, filters)
+
+        if cursor is not None:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            q = q.filter(tuple_(cls.date, cls.id) < tuple_(cursor_date, cursor_id))
+
         try:
-            q = db.query(cls)
-            if user is not None:
-                q = q.filter(cls.user_id == user)
+            # Fetch one extra row to know whether another page exists without a COUNT query.
+            expenses = q.order_by(cls.date.desc(), cls.id.desc()).limit(limit + 1).all()
+        except SQLAlchemyError:
+            raise internal_server_exception
 
-            if month > 0:
-                q = q.filter(extract("month", cls.date) == month)
+        next_cursor = None
+        if len(expenses) > limit:
+            expenses = expenses[:limit]
+            next_cursor = encode_cursor(expenses[-1].date, expenses[-1].id)
 
-            expenses = q.all()
+        if with_employee:
+            return ExpenseWithEmployeePage(items=cls.validate_rows_with_employee(expenses), next_cursor=next_cursor)
+        return ExpensePage(items=cls.validate_rows(expenses), next_cursor=next_cursor)
 
-            return [ExpenseRetrieve.model_validate(expense) for expense in expenses]
+    @classmethod
+    def search_text(cls) -> ColumnElement[str]:
+        """Title and description as one string, the expression of the trigram index."""
+        # The literals are rendered as such rather than as bound parameters, so the expression matches the index's
+        return cls.title + literal_column("' '") + func.coalesce(cls.description, literal_column("''"))
+
+    @classmethod
+    def search_expenses(cls, db: Session, query: str, filters: ExpenseFilter, limit: int, cursor: str | None = None) -> ExpensePage:
+        """Reports matching query, best match first, keyset-paginated on (rank, id). Pass the returned next_cursor to get
+        the following page. Whole words match through search_vector, stemmed (hotels finds hotel) and with web search
+        syntax ("quoted phrases", or, -excluded). From TRIGRAM_MIN_LENGTH characters, any substring (part of a vendor name,
+        a word prefix) also matches through the trigram index. Matches in the title rank higher."""
+        ts_query = func.websearch_to_tsquery("english", query)
+        matches = cls.search_vector.op("@@")(ts_query)
+        rank = func.ts_rank(cls.search_vector, ts_query)
+        if len(query) >= TRIGRAM_MIN_LENGTH:
+            matches = or_(matches, cls.search_text().ilike(f"%{escape_like(query)}%", escape="\\"))
+            rank = rank + func.word_similarity(query, cls.search_text())
+
+        q = cls.filter_query(db.query(*cls.retrieve_columns(), rank.label("rank")).filter(matches), filters)
+
+        if cursor is not None:
+            cursor_rank, cursor_id = decode_search_cursor(cursor)
+            # The rank is a real, which the driver returns rounded to its shortest text form. Compared as a real again
+            # it equals the rank it came from; compared as a double it wouldn't, and rows tied with it would be skipped.
+            q = q.filter(tuple_(rank, cls.id) < tuple_(cast(cursor_rank, REAL), cursor_id))
+
+        try:
+            expenses = q.order_by(rank.desc(), cls.id.desc()).limit(limit + 1).all()
         except SQLAlchemyError:
             raise internal_server_exception
 
+        next_cursor = None
+        if len(expenses) > limit:
+            expenses = expenses[:limit]
+            next_cursor = encode_search_cursor(expenses[-1].rank, expenses[-1].id)
+
+        # validate_rows ignores the trailing rank column
+        return ExpensePage(items=cls.validate_rows(expenses), next_cursor=next_cursor)
+
+    @classmethod
+    def export_expenses(cls, db: Session, filters: ExpenseFilter, batch_size: int = 1000) -> Iterator[Row]:
+        """Yields the matching reports oldest first as plain rows, fetched through a server-side cursor
+        batch_size rows at a time, so memory stays constant however many rows match."""
+        columns = (cls.id, cls.user_id, cls.title, cls.date, cls.amount, cls.status, cls.admin_comment, cls.description, cls.file)
+        q = cls.filter_query(db.query(*columns), filters)
+        yield from q.order_by(cls.date, cls.id).yield_per(batch_size)
+
+    @classmethod
+    def status_event(cls, expense_id: int, user_id: str, status: str, previous_status: str, admin_comment: str | None) -> ExpenseStatusEvent:
+        truncated = admin_comment is not None and len(admin_comment) > MAX_EVENT_COMMENT_LENGTH
+        return ExpenseStatusEvent(
+            id=expense_id,
+            user_id=user_id,
+            status=status,
+            previous_status=previous_status,
+            admin_comment=admin_comment[:MAX_EVENT_COMMENT_LENGTH] if truncated else admin_comment,
+            admin_comment_truncated=truncated,
+        )
+
+    @classmethod
+    def notify_status_events(cls, events: list[ExpenseStatusEvent]) -> TextClause:
+        """pg_notify statement announcing the events to their owners' GET /reports/events streams, in every app process.
+        Execute it in the transaction making the changes: Postgres delivers the notifications when it commits, and drops
+        them if it rolls back."""
+        return NOTIFY_STATUS_EVENTS.bindparams(channel=STATUS_EVENTS_CHANNEL, payloads=[event.model_dump_json() for event in events])
+
     @classmethod
     def update_expense_status(cls, db: Session, expense_id: int, status: str, admin_comment: str | None) -> ExpenseRetrieve:
         if status not in ["Pending", "Approved", "Rejected"]:
@@ -127,14 +357,93 @@ class ExpenseReport(Base):
             if not expense:
                 raise bad_expense_access_exception
 
+            old_status = expense.status
             expense.status = status
 
+            if old_status != status:
+                db.execute(ExpenseReportRollup.delta(expense.user_id, expense.date, old_status, -expense.amount, -1))
+                db.execute(ExpenseReportRollup.delta(expense.user_id, expense.date, status, expense.amount, 1))
+
             if admin_comment is not None:
                 expense.admin_comment = admin_comment
 
+            if old_status != status or admin_comment is not None:
+                event = cls.status_event(expense.id, expense.user_id, status, old_status, expense.admin_comment)
+                db.execute(cls.notify_status_events([event]))
+
+            db.execute(ListVersion.bump(user_expenses_scope(expense.user_id), ALL_EXPENSES_SCOPE))
             db.commit()
             db.refresh(expense)
             return ExpenseRetrieve.model_validate(expense)
         except SQLAlchemyError:
             db.rollback()
             raise internal_server_exception
+
+    @classmethod
+    def bulk_update_status(cls, db: Session, bulk_update: ExpenseBulkUpdateStatus) -> ExpenseBulkUpdateResult:
+        """Sets the status of every selected report with a single UPDATE ... RETURNING, plus one upsert for the rollups.
+
+        Filters may select at most MAX_BULK_IDS reports, like ids: when more match nothing is updated and
+        bulk_selection_too_large_exception is raised, rather than updating (and notifying) them all in one transaction."""
+        if bulk_update.ids is not None:
+            conditions = [cls.id.in_(bulk_update.ids)]
+        else:
+            conditions = cls.filter_conditions(bulk_update.filters)
+
+        # Lock the selected rows and keep their current status, RETURNING only sees the new values of the updated table.
+        previous = select(cls.id, cls.date, cls.status.label("previous_status")).where(*conditions).with_for_update()
+        if bulk_update.ids is None:
+            # One more than allowed, to tell whether there are more
+            previous = previous.limit(MAX_BULK_IDS + 1)
+        previous = previous.subquery()
+
+        values = {"status": bulk_update.status}
+        if bulk_update.admin_comment is not None:
+            values["admin_comment"] = bulk_update.admin_comment
+
+        stmt = (
+            update(cls)
+            # On the whole primary key, each row is then looked up in its own partition only
+            .where(cls.id == previous.c.id, cls.date == previous.c.date)
+            .values(**values)
+            .returning(cls.id, cls.user_id, cls.date, cls.amount, cls.admin_comment, previous.c.previous_status)
+            .execution_options(synchronize_session=False)
+        )
+
+        try:
+            updated = db.execute(stmt).all()
+            if len(updated) > MAX_BULK_IDS:
+                db.rollback()
+                raise bulk_selection_too_large_exception(MAX_BULK_IDS)
+
+            changes = []
+            for row in updated:
+                if row.previous_status != bulk_update.status:
+                    changes.append((row.user_id, row.date, row.previous_status, -row.amount, -1))
+                    changes.append((row.user_id, row.date, bulk_update.status, row.amount, 1))
+            if changes:
+                db.execute(ExpenseReportRollup.deltas(changes))
+
+            events = [
+                cls.status_event(row.id, row.user_id, bulk_update.status, row.previous_status, row.admin_comment)
+                for row in updated
+                if row.previous_status != bulk_update.status or bulk_update.admin_comment is not None
+            ]
+            if events:
+                db.execute(cls.notify_status_events(events))
+
+            if updated:
+                db.execute(ListVersion.bump(ALL_EXPENSES_SCOPE, *(user_expenses_scope(row.user_id) for row in updated)))
+
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise internal_server_exception
+
+        previous_statuses = {row.id: row.previous_status for row in updated}
+        requested_ids = bulk_update.ids if bulk_update.ids is not None else list(previous_statuses)
+        results = [
+            ExpenseBulkItemResult(id=expense_id, updated=expense_id in previous_statuses, previous_status=previous_statuses.get(expense_id))
+            for expense_id in dict.fromkeys(requested_ids)
+        ]
+        return ExpenseBulkUpdateResult(updated_count=len(updated), results=results)
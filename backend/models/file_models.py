@@ -0,0 +1,101 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, update, delete, select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import Base
+from datetime import datetime, timedelta
+import os
+
+FILE_DELETION_MAX_ATTEMPTS = int(os.environ.get("FILE_DELETION_MAX_ATTEMPTS", 8))
+FILE_DELETION_BASE_BACKOFF = int(os.environ.get("FILE_DELETION_BASE_BACKOFF", 30))  # Seconds, doubled after every failed attempt
+
+
+class StoredFile(Base):
+    """Uploaded files keyed by the SHA-256 of their folder and content (see hash_file), with the number of users/reports
+    referencing each one."""
+    __tablename__ = 'stored_files'
+
+    content_hash = Column(String(64), primary_key=True)
+    url = Column(String, unique=True, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=1)
+
+    @classmethod
+    async def acquire(cls, db: AsyncSession, content_hash: str) -> str | None:
+        """Adds a reference to an already stored file and returns its URL, or None if this content isn't stored yet."""
+        url = await db.scalar(update(cls).where(cls.content_hash == content_hash).values(ref_count=cls.ref_count + 1).returning(cls.url))
+        await db.commit()
+        return url
+
+    @classmethod
+    async def register(cls, db: AsyncSession, content_hash: str, url: str) -> str:
+        """Records a newly stored file. If the same content was registered concurrently, references that one instead."""
+        stmt = insert(cls).values(content_hash=content_hash, url=url, ref_count=1)
+        stmt = stmt.on_conflict_do_update(index_elements=[cls.content_hash], set_={"ref_count": cls.ref_count + 1}).returning(cls.url)
+        registered_url = await db.scalar(stmt)
+        await db.commit()
+        return registered_url
+
+    @classmethod
+    async def registered_urls(cls, db: AsyncSession, urls: set[str]) -> set[str]:
+        """The urls among urls that are stored files, referenced by something."""
+        return set((await db.scalars(select(cls.url).where(cls.url.in_(urls)))).all())
+
+    @classmethod
+    async def release(cls, db: AsyncSession, url: str) -> bool:
+        """Drops a reference to the file at url. Returns whether the file itself should now be deleted,
+        which is also the case for files uploaded before they were tracked here. The caller commits."""
+        ref_count = await db.scalar(update(cls).where(cls.url == url).values(ref_count=cls.ref_count - 1).returning(cls.ref_count))
+        if ref_count is None:
+            return True
+
+        if ref_count <= 0:
+            # Only delete if nobody referenced it again in the meantime
+            ref_count = await db.scalar(delete(cls).where(cls.url == url, cls.ref_count <= 0).returning(cls.ref_count))
+        return ref_count is not None and ref_count <= 0
+
+
+class FileDeletion(Base):
+    """Durable queue of files to delete from storage, drained in batches by services.files_service.deletion_worker.
+
+    Add a FileDeletion(url=...) to the session of the change that stops using the file, so the deletion is queued
+    if and only if that change is committed."""
+    __tablename__ = 'file_deletions'
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_file_deletions_next_attempt_at", "next_attempt_at"),
+    )
+
+    @classmethod
+    async def claim_batch(cls, db: AsyncSession, size: int) -> list["FileDeletion"]:
+        """Locks up to size due deletions. SKIP LOCKED lets every app worker drain the queue without handing out a row twice."""
+        stmt = (
+            select(cls)
+            .where(cls.next_attempt_at <= datetime.now(), cls.attempts < FILE_DELETION_MAX_ATTEMPTS)
+            .order_by(cls.next_attempt_at)
+            .limit(size)
+            .with_for_update(skip_locked=True)
+        )
+        return list((await db.scalars(stmt)).all())
+
+    def retry_later(self, error: str) -> None:
+        self.attempts += 1
+        self.last_error = error
+        self.next_attempt_at = datetime.now() + timedelta(seconds=FILE_DELETION_BASE_BACKOFF * 2 ** (self.attempts - 1))
+
+    @classmethod
+    def queue_stats(cls, db: Session) -> dict:
+        pending, failed = db.execute(
+            select(
+                func.count().filter(cls.attempts < FILE_DELETION_MAX_ATTEMPTS),
+                func.count().filter(cls.attempts >= FILE_DELETION_MAX_ATTEMPTS),
+            )
+        ).one()
+        oldest = db.scalar(select(func.min(cls.created_at)).where(cls.attempts < FILE_DELETION_MAX_ATTEMPTS))
+        return {"pending": pending, "failed": failed, "oldest_pending_at": oldest}
@@ -0,0 +1,87 @@
+from sqlalchemy import Column, Integer, Float, Date, ForeignKey, Enum, func
+from sqlalchemy.dialects.postgresql import UUID, Insert, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from database import Base
+from schema import ExpenseStatus, ExpenseAggregate, StatusTotal, UserTotal, MonthTotal, month_range
+from datetime import datetime
+from collections import defaultdict
+from typing import Iterable
+from exceptions import internal_server_exception
+
+
+class ExpenseReportRollup(Base):
+    """Per (month, user, status) totals of expense_reports, kept current by the ExpenseReport write methods so the
+    admin dashboard can read totals without scanning every report."""
+    __tablename__ = 'expense_report_rollups'
+
+    month = Column(Date, primary_key=True)  # First day of the month
+    user_id = Column(UUID, ForeignKey('users.id'), primary_key=True)
+    status = Column(Enum(ExpenseStatus), primary_key=True)
+    total_amount = Column(Float, nullable=False, default=0)
+    report_count = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def delta(cls, user_id: UUID, report_date: datetime, status: str, amount: float, count: int) -> Insert:
+        """Upsert statement adding amount/count (negative to subtract) to the matching group.
+        The caller executes it in the same transaction as the report change, with either a sync or an async session."""
+        return cls.deltas([(user_id, report_date, status, amount, count)])
+
+    @classmethod
+    def deltas(cls, changes: Iterable[tuple[UUID, datetime, str, float, int]]) -> Insert:
+        """Same as delta for many (user_id, report_date, status, amount, count) changes in one statement. Changes to
+        the same group are merged first since a single upsert can't update a row twice. changes must not be empty."""
+        groups = defaultdict(lambda: [0.0, 0])
+        for user_id, report_date, status, amount, count in changes:
+            group = groups[(report_date.date().replace(day=1), user_id, ExpenseStatus(status))]
+            group[0] += amount
+            group[1] += count
+
+        stmt = insert(cls).values([
+            {"month": month, "user_id": user_id, "status": status, "total_amount": amount, "report_count": count}
+            for (month, user_id, status), (amount, count) in groups.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.month, cls.user_id, cls.status],
+            set_={
+                "total_amount": cls.total_amount + stmt.excluded.total_amount,
+                "report_count": cls.report_count + stmt.excluded.report_count,
+            },
+        )
+        return stmt
+
+    @classmethod
+    def get_aggregate(cls, db: Session, year: int, month: int, top: int) -> ExpenseAggregate:
+        """Totals for the given year, or only for one month of it when month > 0."""
+        from .user_models import User
+
+        if month > 0:
+            start, end = month_range(year, month)
+        else:
+            start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+        totals = (func.sum(cls.total_amount).label("total_amount"), func.sum(cls.report_count).label("report_count"))
+        in_range = (cls.month >= start.date(), cls.month < end.date(), cls.report_count > 0)
+
+        try:
+            by_status = db.query(cls.status, *totals).filter(*in_range).group_by(cls.status).all()
+            by_month = db.query(cls.month, *totals).filter(*in_range).group_by(cls.month).order_by(cls.month).all()
+
+            by_user_query = db.query(cls.user_id, User.username, *totals).join(User, User.id == cls.user_id).filter(*in_range)
+            by_user = by_user_query.group_by(cls.user_id, User.username).order_by(User.username).all()
+            top_spenders = (
+                by_user_query.filter(cls.status == ExpenseStatus.APPROVED)
+                .group_by(cls.user_id, User.username)
+                .order_by(func.sum(cls.total_amount).desc())
+                .limit(top)
+                .all()
+            )
+        except SQLAlchemyError:
+            raise internal_server_exception
+
+        return ExpenseAggregate(
+            by_status=[StatusTotal.model_validate(row) for row in by_status],
+            by_month=[MonthTotal.model_validate(row) for row in by_month],
+            by_user=[UserTotal.model_validate(row) for row in by_user],
+            top_spenders=[UserTotal.model_validate(row) for row in top_spenders],
+        )
@@ -1,14 +1,20 @@
-from fastapi import UploadFile, BackgroundTasks
-from sqlalchemy import Column, String, Boolean, Enum
+from fastapi import UploadFile
+from sqlalchemy import Column, String, Boolean, Enum, ColumnElement, select, cast, case
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Session, relationship
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from database import Base
+from .file_models import FileDeletion
+from .version_models import ListVersion, USERS_SCOPE
 from schema import UserCreate, UserRetrieve, UserRole, UserUpdate
-from utils import hash_password, verify_password
+from utils import hash_password_in_pool, verify_password_in_pool, invalidate_user_tokens, user_cache
 from exceptions import user_exists_exception, internal_server_exception, auth_failed_exception, user_not_found_exception
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
 
 class User(Base):
     __tablename__ = 'users'
@@ -29,104 +35,146 @@ class User(Base):
 
     # Class methods
     @classmethod
-    def create_user(cls, db: Session, user: UserCreate, from_google: bool = False) -> UserRetrieve:
+    async def create_user(cls, db: AsyncSession, user: UserCreate, from_google: bool = False) -> UserRetrieve:
 
         new_user = User(is_active=True, role=UserRole.USER, **user.model_dump(exclude={"password"}, exclude_none=True, exclude_unset=True))
 
         if not from_google:
-            new_user.hashed_password = hash_password(user.password)
+            new_user.hashed_password = await hash_password_in_pool(user.password)
 
         try:
             db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
+            await db.execute(ListVersion.bump(USERS_SCOPE))
+            await db.commit()
             return UserRetrieve.model_validate(new_user)
         except IntegrityError:
-            db.rollback()
+            await db.rollback()
             raise user_exists_exception
         except SQLAlchemyError:
-            db.rollback()
+            await db.rollback()
             raise internal_server_exception
 
     @classmethod
-    def authenticate_user(cls, username: str, password: str, db: Session) -> UserRetrieve:
-        user = db.query(User).filter(User.username == username).first()
-        if not user or not verify_password(password, user.hashed_password):
+    async def authenticate_user(cls, username: str, password: str, db: AsyncSession) -> UserRetrieve:
+        user = await db.scalar(select(User).where(User.username == username))
+        if not user or not user.hashed_password:  # No password for accounts created with Google
             raise auth_failed_exception
 
-        db.refresh(user)
-        return UserRetrieve.model_validate(user)
+        is_valid, new_hash = await verify_password_in_pool(password, user.hashed_password)
+        if not is_valid:
+            raise auth_failed_exception
+
+        # Built before the rehash is committed: a rollback expires user, and an AsyncSession can't lazy load it again
+        retrieved = UserRetrieve.model_validate(user)
+
+        # The stored hash was made with a different bcrypt cost than BCRYPT_ROUNDS, replace it now that we know the password
+        if new_hash is not None:
+            user.hashed_password = new_hash
+            try:
+                await db.commit()
+            except SQLAlchemyError:
+                await db.rollback()
+                # The old hash still verifies, the next login tries again
+                logger.warning("Couldn't store the rehashed password of user %s", retrieved.id, exc_info=True)
+
+        return retrieved
+
+    @classmethod
+    def retrieve_columns(cls) -> list[ColumnElement]:
+        """The columns of UserRetrieve in field order, id and role as text (see ExpenseReport.retrieve_columns)."""
+        columns = {
+            "id": cast(cls.id, String),
+            "role": case({role.name: role.value for role in UserRole}, value=cast(cls.role, String)).label("role"),
+        }
+        return [columns.get(field, getattr(cls, field)) for field in UserRetrieve.model_fields]
 
     @classmethod
-    def get_all_users(cls, db: Session) -> list[UserRetrieve]:
-        users = db.query(User).all()
-        return [UserRetrieve.model_validate(user) for user in users]
+    def get_all_users(cls, db: Session) -> list[dict]:
+        """As rows for user_row_list_adapter, unvalidated like ExpenseReport.get_user_expenses."""
+        fields = UserRetrieve.model_fields.keys()
+        return [dict(zip(fields, row)) for row in db.execute(select(*cls.retrieve_columns()))]
 
     @classmethod
-    def get_user(cls, user_id: UUID, db: Session) -> UserRetrieve | None:
-        user = db.query(User).filter(User.id == user_id).first()
+    async def get_user(cls, user_id: UUID, db: AsyncSession) -> UserRetrieve | None:
+        cached = await user_cache.get_by_id(user_id)
+        if cached is not None:
+            return cached
+
+        user = await db.scalar(select(User).where(User.id == user_id))
         if user:
-            return UserRetrieve.model_validate(user)
+            retrieved = UserRetrieve.model_validate(user)
+            await user_cache.set(retrieved)
+            return retrieved
         return None
 
     @classmethod
-    def get_user_by_google_id(cls, google_id: str, db: Session) -> UserRetrieve | None:
-        user = db.query(User).filter(User.google_id == google_id).first()
+    async def get_user_by_google_id(cls, google_id: str, db: AsyncSession) -> UserRetrieve | None:
+        cached = await user_cache.get_by_google_id(google_id)
+        if cached is not None:
+            return cached
+
+        user = await db.scalar(select(User).where(User.google_id == google_id))
         if user:
-            return UserRetrieve.model_validate(user)
+            retrieved = UserRetrieve.model_validate(user)
+            await user_cache.set(retrieved)
+            return retrieved
         return None
 
     @classmethod
-    def update_user_role(cls, db: Session, user_id: UUID, new_role: UserRole) -> UserRetrieve:
-        user = db.query(User).filter(User.id == user_id).first()
+    async def update_user_role(cls, db: AsyncSession, user_id: UUID, new_role: UserRole) -> UserRetrieve:
+        user = await db.scalar(select(User).where(User.id == user_id))
         if not user:
             raise user_not_found_exception
 
         user.role = new_role
         try:
-            db.commit()
-            db.refresh(user)
-            return UserRetrieve.model_validate(user)
+            await db.execute(ListVersion.bump(USERS_SCOPE))
+            await db.commit()
         except SQLAlchemyError:
-            db.rollback()
+            await db.rollback()
             raise internal_server_exception
 
+        invalidate_user_tokens(user_id)
+        await user_cache.invalidate(user.id, user.google_id)
+        return UserRetrieve.model_validate(user)
+
     @classmethod
     async def update_user(
         cls,
         user_id: UUID,
         user_update: UserUpdate,
         avatar: UploadFile | None,
-        db: Session,
-        background_tasks: BackgroundTasks,
+        db: AsyncSession,
     ) -> UserRetrieve:
-        from services.files_service import upload_file, delete_file_by_url
+        from services.files_service import upload_file, discard_upload
 
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.scalar(select(User).where(User.id == user_id))
         if not user:
             raise user_not_found_exception
 
         old_avatar = user.avatar
 
         if avatar:
-            avatar_link = await upload_file(avatar, folder="avatars/")
+            avatar_link = await upload_file(db, avatar, folder="avatars/")
             user.avatar = avatar_link
 
         to_update = user_update.model_dump(exclude_none=True, exclude_unset=True)
         for key, value in to_update.items():
             setattr(user, key, value)
 
-        try:
-            db.commit()
-            db.refresh(user)
+        # Drops the old avatar's reference, the file itself is only deleted if nothing else uses it (it may be the same content).
+        if avatar and old_avatar:
+            db.add(FileDeletion(url=old_avatar))
 
-            if avatar and old_avatar:
-                background_tasks.add_task(delete_file_by_url, old_avatar)
-
-            return UserRetrieve.model_validate(user)
-        except IntegrityError:
-            db.rollback()
-            raise user_exists_exception
-        except SQLAlchemyError:
-            db.rollback()
-            raise internal_server_exception
+        try:
+            await db.execute(ListVersion.bump(USERS_SCOPE))
+            await db.commit()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            # The new avatar's reference was committed by upload_file, nothing uses it now
+            if avatar:
+                await discard_upload(db, avatar_link)
+            raise user_exists_exception if isinstance(e, IntegrityError) else internal_server_exception
+
+        await user_cache.invalidate(user.id, user.google_id)
+        return UserRetrieve.model_validate(user)
@@ -0,0 +1,46 @@
+from sqlalchemy import Column, String, BigInteger, select
+from sqlalchemy.dialects.postgresql import Insert, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from uuid import UUID
+from database import Base
+from exceptions import internal_server_exception
+
+ALL_EXPENSES_SCOPE = "expenses"
+USERS_SCOPE = "users"
+
+
+def user_expenses_scope(user_id: UUID | str) -> str:
+    return f"expenses:{user_id}"
+
+
+class ListVersion(Base):
+    """Change counter per cached listing (one user's reports, all reports, all users), bumped in the same transaction
+    as every write to it. The list endpoints derive their ETag from it, so a conditional GET costs one primary key lookup."""
+    __tablename__ = 'list_versions'
+
+    scope = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def bump(cls, *scopes: str) -> Insert:
+        """Upsert statement incrementing the given scopes, executed by the caller with either a sync or an async session.
+        It locks the scope rows until commit, so execute it last, right before committing."""
+        stmt = insert(cls).values([{"scope": scope, "version": 1} for scope in sorted(set(scopes))])
+        return stmt.on_conflict_do_update(index_elements=[cls.scope], set_={"version": cls.version + 1})
+
+    @classmethod
+    def get(cls, db: Session, scope: str) -> int:
+        try:
+            return db.scalar(select(cls.version).where(cls.scope == scope)) or 0
+        except SQLAlchemyError:
+            raise internal_server_exception
+
+    @classmethod
+    def get_many(cls, db: Session, *scopes: str) -> tuple[int, ...]:
+        """Versions of several scopes in one query, in the order given."""
+        try:
+            versions = dict(db.execute(select(cls.scope, cls.version).where(cls.scope.in_(scopes))).tuples().all())
+        except SQLAlchemyError:
+            raise internal_server_exception
+        return tuple(versions.get(scope, 0) for scope in scopes)
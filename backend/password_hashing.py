@@ -0,0 +1,41 @@
+# Password hashing primitives. Kept in a module of their own with no app imports, since they are what the
+# password pool's worker processes import (see utils/auth/password_pool.py).
+from typing import TYPE_CHECKING
+import os
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+# Cost factor of new hashes. Hashes with any other cost are rehashed on the next successful login.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
+bcrypt_context: "CryptContext | None" = None
+
+
+def get_bcrypt_context() -> "CryptContext":
+    # Built on first use, passlib is only needed by the processes that actually hash
+    global bcrypt_context
+    if bcrypt_context is None:
+        from passlib.context import CryptContext
+
+        bcrypt_context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__rounds=BCRYPT_ROUNDS,
+            bcrypt__min_rounds=BCRYPT_ROUNDS,
+            bcrypt__max_rounds=BCRYPT_ROUNDS,
+        )
+    return bcrypt_context
+
+
+def hash_password(password: str) -> str:
+    return get_bcrypt_context().hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return get_bcrypt_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Returns whether the password matches, and a new hash if the stored one should be replaced (different cost)."""
+    return get_bcrypt_context().verify_and_update(plain_password, hashed_password)
@@ -1,3 +1,34 @@
-from .user_schemas import UserCreate, UserRetrieve, CurrentUser, LoginResponse, UserRole, UserSignup, UserUpdate, user_update_mapper
+from .user_schemas import UserCreate, UserRetrieve, CurrentUser, LoginResponse, UserRole, UserSignup, UserUpdate, user_update_mapper, user_list_adapter, user_row_list_adapter
 from .auth_schemas import Token
-from .expense_schemas import ExpenseCreate, ExpenseRetrieve, ExpenseUpdate, ExpenseUpdateStatus, ExpenseStatus, expense_create_mapper, expense_update_mapper
+from .expense_schemas import (
+    ExpenseCreate,
+    ExpenseRetrieve,
+    ExpenseUpdate,
+    ExpenseUpdateStatus,
+    ExpenseStatusEvent,
+    ExpenseStatus,
+    expense_create_mapper,
+    expense_update_mapper,
+    ExpenseFilter,
+    ExpensePage,
+    expense_list_adapter,
+    expense_row_list_adapter,
+    expense_page_adapter,
+    EmployeeSummary,
+    ExpenseWithEmployee,
+    ExpenseWithEmployeePage,
+    expense_with_employee_list_adapter,
+    expense_with_employee_page_adapter,
+    expense_filter_mapper,
+    month_range,
+    StatusTotal,
+    UserTotal,
+    MonthTotal,
+    ExpenseAggregate,
+    ExpenseBulkUpdateStatus,
+    MAX_BULK_IDS,
+    ExpenseBulkItemResult,
+    ExpenseBulkUpdateResult,
+    ExpenseImportError,
+    ExpenseImportResult,
+)
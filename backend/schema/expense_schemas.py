@@ -1,7 +1,12 @@
-from fastapi import Form
-from pydantic import BaseModel, UUID4
-from datetime import datetime
+from fastapi import Form, Query
+from pydantic import BaseModel, UUID4, TypeAdapter, Field, model_validator
+from typing import Annotated
+from datetime import datetime, date
+from .rows import row_list_adapter
 import enum
+import os
+
+MAX_BULK_IDS = int(os.environ.get("MAX_BULK_IDS", 1000))
 
 
 class ExpenseStatus(str, enum.Enum):
@@ -12,18 +17,19 @@ class ExpenseStatus(str, enum.Enum):
 
 class ExpenseCreate(BaseModel):
     title: str
-    amount: float
+    # nan or inf would stick in the rollup's totals for good (nan - nan is nan)
+    amount: float = Field(allow_inf_nan=False)
     description: str | None = None
     file: str | None = None
 
 
-def expense_create_mapper(title: str = Form(...), amount: float = Form(...), description: str | None = Form(None)) -> ExpenseCreate:
+def expense_create_mapper(title: str = Form(...), amount: float = Form(..., allow_inf_nan=False), description: str | None = Form(None)) -> ExpenseCreate:
     return ExpenseCreate(title=title, amount=amount, description=description)
 
 
 class ExpenseUpdate(BaseModel):
     title: str | None = None
-    amount: float | None = None
+    amount: float | None = Field(None, allow_inf_nan=False)
     description: str | None = None
     file: str | None = None
 
@@ -31,7 +37,7 @@ class ExpenseUpdate(BaseModel):
         extra = "forbid"
 
 
-def expense_update_mapper(title: str | None = Form(None), amount: float | None = Form(None), description: str | None = Form(None)) -> ExpenseUpdate:
+def expense_update_mapper(title: str | None = Form(None), amount: float | None = Form(None, allow_inf_nan=False), description: str | None = Form(None)) -> ExpenseUpdate:
     return ExpenseUpdate(title=title, amount=amount, description=description)
 
 
@@ -52,3 +58,167 @@ class ExpenseUpdateStatus(BaseModel):
 
     class Config:
         extra = "forbid"
+
+
+class ExpenseStatusEvent(BaseModel):
+    """Pushed to the report's owner by GET /reports/events when an admin changes its status or comment."""
+    id: int
+    user_id: UUID4
+    status: ExpenseStatus
+    previous_status: ExpenseStatus
+    admin_comment: str | None = None
+    admin_comment_truncated: bool = False  # Long comments are cut to fit a notification, fetch the report for all of it
+
+
+class ExpenseFilter(BaseModel):
+    status: ExpenseStatus | None = None
+    user_id: UUID4 | None = None
+    min_amount: float | None = None
+    max_amount: float | None = None
+    date_from: datetime | None = None
+    date_to: datetime | None = None
+    month: int = Field(0, ge=0, le=12)
+    year: int | None = Field(None, ge=1970, le=9998)  # Year the month filter applies to, defaults to the current year
+
+    class Config:
+        extra = "forbid"
+
+    def has_conditions(self) -> bool:
+        """Whether the filter narrows the reports down at all, year alone doesn't."""
+        return self.month > 0 or any(value is not None for name, value in self if name not in ("month", "year"))
+
+
+def expense_filter_mapper(
+        status: ExpenseStatus | None = Query(None),
+        user_id: UUID4 | None = Query(None),
+        min_amount: Annotated[float | None, Query(ge=0)] = None,
+        max_amount: Annotated[float | None, Query(ge=0)] = None,
+        date_from: datetime | None = Query(None),
+        date_to: datetime | None = Query(None),
+        month: Annotated[int, Query(ge=0, le=12)] = 0,
+        # December's range ends on January 1st of the next year, which has to be a valid datetime
+        year: Annotated[int | None, Query(ge=1970, le=9998)] = None,
+) -> ExpenseFilter:
+    return ExpenseFilter(
+        status=status,
+        user_id=user_id,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        date_from=date_from,
+        date_to=date_to,
+        month=month,
+        year=year,
+    )
+
+
+def month_range(year: int, month: int) -> tuple[datetime, datetime]:
+    """Half-open [start, end) datetime range covering the given month."""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+class ExpensePage(BaseModel):
+    items: list[ExpenseRetrieve]
+    next_cursor: str | None = None  # None when there are no more pages
+
+
+class EmployeeSummary(BaseModel):
+    username: str
+    full_name: str | None = None  # None if created via Google OAuth
+    avatar: str | None = None
+
+
+class ExpenseWithEmployee(ExpenseRetrieve):
+    employee: EmployeeSummary
+
+
+class ExpenseWithEmployeePage(BaseModel):
+    items: list[ExpenseWithEmployee]
+    next_cursor: str | None = None  # None when there are no more pages
+
+
+# Validate a whole list of rows (or dump it to JSON) in one call instead of one model_validate per row
+expense_list_adapter = TypeAdapter(list[ExpenseRetrieve])
+# Rows of ExpenseReport.retrieve_columns, which selects user_id and status as text
+expense_row_list_adapter = row_list_adapter(ExpenseRetrieve, user_id=str, status=str)
+expense_page_adapter = TypeAdapter(ExpensePage)
+expense_with_employee_list_adapter = TypeAdapter(list[ExpenseWithEmployee])
+expense_with_employee_page_adapter = TypeAdapter(ExpenseWithEmployeePage)
+
+
+class StatusTotal(BaseModel):
+    status: ExpenseStatus
+    total_amount: float
+    report_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class UserTotal(BaseModel):
+    user_id: UUID4
+    username: str
+    total_amount: float
+    report_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class MonthTotal(BaseModel):
+    month: date  # First day of the month
+    total_amount: float
+    report_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class ExpenseAggregate(BaseModel):
+    by_status: list[StatusTotal]
+    by_user: list[UserTotal]
+    by_month: list[MonthTotal]
+    top_spenders: list[UserTotal]  # Ranked by approved amount
+
+
+class ExpenseBulkUpdateStatus(BaseModel):
+    """Either ids or filters selects the reports to update, not both, up to MAX_BULK_IDS reports. Filters must set at
+    least one condition."""
+    ids: Annotated[list[int], Field(max_length=MAX_BULK_IDS)] | None = None
+    filters: ExpenseFilter | None = None
+    status: ExpenseStatus
+    admin_comment: str | None = None
+
+    class Config:
+        extra = "forbid"
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if (self.ids is None) == (self.filters is None):
+            raise ValueError("Provide exactly one of ids or filters.")
+        if self.filters is not None and not self.filters.has_conditions():
+            raise ValueError("Filters must set at least one condition, besides year.")
+        return self
+
+
+class ExpenseBulkItemResult(BaseModel):
+    id: int
+    updated: bool
+    previous_status: ExpenseStatus | None = None  # None if the report doesn't exist
+
+
+class ExpenseBulkUpdateResult(BaseModel):
+    updated_count: int
+    results: list[ExpenseBulkItemResult]
+
+
+class ExpenseImportError(BaseModel):
+    row: int  # 1-based, not counting the CSV header
+    errors: list[str]
+
+
+class ExpenseImportResult(BaseModel):
+    created_count: int
+    ids: list[int]
+    errors: list[ExpenseImportError] = []  # Nothing is imported if any row has errors
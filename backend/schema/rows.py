@@ -0,0 +1,11 @@
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict  # typing.TypedDict isn't supported by pydantic before Python 3.12
+
+
+def row_list_adapter(model: type[BaseModel], **annotations: type) -> TypeAdapter:
+    """Adapter of lists of rows (dicts) with the fields of model, whose dump_json writes the same JSON as model's.
+
+    For serializing only: the rows aren't validated as model would validate them, the database already typed them.
+    annotations overrides the type of fields selected in another form, e.g. a UUID selected as text."""
+    fields = {name: annotations.get(name, field.annotation) for name, field in model.model_fields.items()}
+    return TypeAdapter(list[TypedDict(f"{model.__name__}Row", fields)])
@@ -1,6 +1,7 @@
 from fastapi import Form
-from pydantic import BaseModel, EmailStr, UUID4
+from pydantic import BaseModel, EmailStr, UUID4, TypeAdapter
 from .auth_schemas import Token
+from .rows import row_list_adapter
 import enum
 
 
@@ -60,6 +61,11 @@ class UserRetrieve(BaseModel):
         from_attributes = True
 
 
+user_list_adapter = TypeAdapter(list[UserRetrieve])
+# Rows of User.retrieve_columns, which selects id and role as text
+user_row_list_adapter = row_list_adapter(UserRetrieve, id=str, role=str)
+
+
 class CurrentUser(BaseModel):
     id: UUID4
     username: str
@@ -1,4 +1,4 @@
 from .auth import auth_router
-from .expenses import expenses_router
+from .expenses import expenses_router, report_events, run_partition_maintenance
 from .admin_dashboard import admin_router
-from .files_service import configure_cloudinary
+from .files_service import configure_storage, UploadSizeLimitMiddleware, LocalStorage, run_deletion_worker
@@ -1,23 +1,113 @@
-from fastapi import APIRouter, Query, status
-from typing import Annotated
-from models import ExpenseReport
-from schema import ExpenseRetrieve, ExpenseUpdateStatus, UserRetrieve, UserRole
-from models import User
-from utils import db_dep, current_user_dep
+from fastapi import APIRouter, Depends, Query, Header, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Literal, Iterator
+from models import ExpenseReport, ExpenseReportRollup
+from schema import (
+    ExpenseRetrieve,
+    ExpenseUpdateStatus,
+    UserRetrieve,
+    UserRole,
+    ExpenseFilter,
+    ExpensePage,
+    ExpenseWithEmployeePage,
+    expense_page_adapter,
+    expense_with_employee_page_adapter,
+    user_row_list_adapter,
+    expense_filter_mapper,
+    ExpenseAggregate,
+    ExpenseBulkUpdateStatus,
+    ExpenseBulkUpdateResult,
+)
+from models import User, FileDeletion, ListVersion, ALL_EXPENSES_SCOPE, USERS_SCOPE
+from utils import db_dep, read_db_dep, async_db_dep, current_user_dep, MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE, token_cache, user_cache, rate_limiter, AdapterJSONResponse, make_etag, etag_matches, etag_headers
 from uuid import UUID
+from datetime import datetime
 from exceptions import change_own_role_exception
+from database import new_read_session, get_pool_metrics, get_async_pool_metrics, get_replica_status
+from services.files_service import worker_stats
+from services.expenses import report_events, get_partitions_status
+from .export import stream_csv, stream_ndjson
 
 router = APIRouter()
 
 
-@router.get("/reports", response_model=list[ExpenseRetrieve], status_code=status.HTTP_200_OK)
+@router.get("/reports", response_model=ExpensePage | ExpenseWithEmployeePage, status_code=status.HTTP_200_OK)
 def get_all_expense_reports(
-        db: db_dep,
-        user_id: UUID | None = Query(None),
+        db: read_db_dep,
+        filters: Annotated[ExpenseFilter, Depends(expense_filter_mapper)],
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        cursor: str | None = Query(None),
+        include_employee: bool = Query(False),
+        if_none_match: Annotated[str | None, Header()] = None,
+):
+    """Returns one page of reports, newest first. Use `next_cursor` from the response as `cursor` to fetch the next page.
+    With include_employee, every report embeds its employee's username, full name and avatar.
+    Answers 304 when If-None-Match has the ETag of a previous response and no report changed since
+    (nor any user, with include_employee)."""
+    # Before the rows, see GET /reports
+    if include_employee:
+        etag = make_etag(f"{ALL_EXPENSES_SCOPE}+{USERS_SCOPE}", *ListVersion.get_many(db, ALL_EXPENSES_SCOPE, USERS_SCOPE))
+    else:
+        etag = make_etag(ALL_EXPENSES_SCOPE, ListVersion.get(db, ALL_EXPENSES_SCOPE))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+
+    page = ExpenseReport.get_all_expenses(db, filters=filters, limit=limit, cursor=cursor, with_employee=include_employee)
+    adapter = expense_with_employee_page_adapter if include_employee else expense_page_adapter
+    return AdapterJSONResponse(page, adapter, headers=etag_headers(etag))
+
+
+@router.get("/reports/search", response_model=ExpensePage, status_code=status.HTTP_200_OK)
+def search_expense_reports(
+        db: read_db_dep,
+        q: Annotated[str, Query(min_length=1, max_length=200)],
+        filters: Annotated[ExpenseFilter, Depends(expense_filter_mapper)],
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        cursor: str | None = Query(None),
+):
+    """Reports whose title or description match `q`, best match first, narrowed by the same filters as GET /reports.
+    Use `next_cursor` from the response as `cursor` to fetch the next page."""
+    page = ExpenseReport.search_expenses(db, q, filters=filters, limit=limit, cursor=cursor)
+    return AdapterJSONResponse(page, expense_page_adapter)
+
+
+@router.get("/reports/aggregate", response_model=ExpenseAggregate, status_code=status.HTTP_200_OK)
+def get_expense_reports_aggregate(
+        db: read_db_dep,
         month: Annotated[int, Query(ge=0, le=12)] = 0,
+        # The range of a year ends on January 1st of the next one, which has to be a valid datetime
+        year: Annotated[int | None, Query(ge=1970, le=9998)] = None,
+        top: Annotated[int, Query(ge=1, le=100)] = 5,
 ):
-    all_expenses = ExpenseReport.get_all_expenses(db, user=user_id, month=month)
-    return all_expenses
+    """Totals per status, user and month for the given year (current year by default), or one month of it if month is set."""
+    aggregate = ExpenseReportRollup.get_aggregate(db, year=year or datetime.now().year, month=month, top=top)
+    return aggregate
+
+
+@router.get("/reports/export", status_code=status.HTTP_200_OK)
+def export_expense_reports(
+        filters: Annotated[ExpenseFilter, Depends(expense_filter_mapper)],
+        format: Literal["csv", "ndjson"] = "csv",
+):
+    """Streams every report matching the filters (same as GET /reports) as CSV or NDJSON, oldest first."""
+    serializer = stream_csv if format == "csv" else stream_ndjson
+
+    def content() -> Iterator[str]:
+        # The session is opened here rather than through db_dep, so it lives exactly as long as the response body is streamed.
+        with new_read_session() as db:
+            yield from serializer(ExpenseReport.export_expenses(db, filters))
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="expense-reports.{format}"'}
+    return StreamingResponse(content(), media_type=media_type, headers=headers)
+
+
+@router.put("/reports/status", response_model=ExpenseBulkUpdateResult, status_code=status.HTTP_200_OK)
+def bulk_update_expense_reports_status(details: ExpenseBulkUpdateStatus, db: db_dep):
+    """Updates the status of many reports at once, selected either by a list of ids or by the same filters as GET /reports.
+    At most MAX_BULK_IDS reports either way, a 422 is returned (and nothing updated) when the filters select more."""
+    result = ExpenseReport.bulk_update_status(db, details)
+    return result
 
 
 @router.put("/reports/{expense_id}/status", response_model=ExpenseRetrieve, status_code=status.HTTP_200_OK)
@@ -32,20 +122,61 @@ def update_expense_report_status(
 
 
 @router.get("/users", response_model=list[UserRetrieve], status_code=status.HTTP_200_OK)
-def get_all_users(db: db_dep):
+def get_all_users(db: read_db_dep, if_none_match: Annotated[str | None, Header()] = None):
+    etag = make_etag(USERS_SCOPE, ListVersion.get(db, USERS_SCOPE))  # Before the rows, see GET /reports
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+
     all_users = User.get_all_users(db)
-    return all_users
+    return AdapterJSONResponse(all_users, user_row_list_adapter, headers=etag_headers(etag))
 
 
 @router.patch("/users/{user_id}", response_model=UserRetrieve, status_code=status.HTTP_200_OK)
-def update_user_role(
+async def update_user_role(
     user_id: UUID,
     new_role: UserRole,
-    db: db_dep,
+    db: async_db_dep,
     current_user: current_user_dep,
 ):
     if current_user.id == user_id:
         raise change_own_role_exception
 
-    updated_user = User.update_user_role(db, user_id=user_id, new_role=new_role)
+    updated_user = await User.update_user_role(db, user_id=user_id, new_role=new_role)
     return updated_user
+
+
+@router.get("/db/pool", status_code=status.HTTP_200_OK)
+def get_db_pool_status():
+    """Live connection pool stats (checked out and overflow connections, checkout wait and hold times) of both engines,
+    and the replica's lag and pool if DATABASE_REPLICA_URL is set."""
+    return {"sync": get_pool_metrics().snapshot(), "async": get_async_pool_metrics().snapshot(), "replica": get_replica_status()}
+
+
+@router.get("/db/partitions", status_code=status.HTTP_200_OK)
+async def get_expense_partitions(db: async_db_dep):
+    """The expense_reports partitions (date range, estimated rows, size) and this process' maintenance counters."""
+    return await get_partitions_status(db)
+
+
+@router.get("/files/deletions", status_code=status.HTTP_200_OK)
+def get_file_deletion_queue_status(db: db_dep):
+    """Depth of the file deletion queue (failed = gave up after FILE_DELETION_MAX_ATTEMPTS) and this process' worker counters."""
+    return {"queue": FileDeletion.queue_stats(db), "worker": worker_stats}
+
+
+@router.get("/cache", status_code=status.HTTP_200_OK)
+def get_cache_status():
+    """Hit/miss counters of this process' verified token cache and of the user lookup cache."""
+    return {"tokens": token_cache.stats(), "users": user_cache.backend.stats()}
+
+
+@router.get("/rate-limits", status_code=status.HTTP_200_OK)
+def get_rate_limit_status():
+    """Allowed and rejected requests per auth rate limit in this process, and the bucket store's size."""
+    return rate_limiter.stats()
+
+
+@router.get("/events", status_code=status.HTTP_200_OK)
+def get_report_events_status():
+    """Open GET /reports/events streams of this process, its LISTEN connection and notification counters."""
+    return report_events.stats()
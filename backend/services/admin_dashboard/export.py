@@ -0,0 +1,45 @@
+from typing import Iterable, Iterator
+from sqlalchemy import Row
+import csv
+import io
+import json
+
+EXPORT_COLUMNS = ["id", "user_id", "title", "date", "amount", "status", "admin_comment", "description", "file"]
+
+# Rows are written out in chunks of this many, big enough to avoid tiny writes, small enough to keep memory flat.
+CHUNK_ROWS = 1000
+
+
+def _row_values(row: Row) -> list:
+    values = list(row)
+    values[1] = str(row.user_id)
+    values[3] = row.date.isoformat()
+    values[5] = row.status.value
+    return values
+
+
+def stream_csv(rows: Iterable[Row]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(_row_values(row))
+        if i % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows: Iterable[Row]) -> Iterator[str]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, _row_values(row)))))
+        if len(lines) == CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if lines:
+        yield "\n".join(lines) + "\n"
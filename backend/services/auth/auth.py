@@ -1,19 +1,19 @@
-from fastapi import APIRouter, Depends, Response, Cookie, status, UploadFile, File, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, Response, Cookie, status, UploadFile, File, Request
 from typing import Annotated
 from models import User
 import os
 from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from utils import create_access_token, create_refresh_token, db_dep, current_user_dep, decode_refresh_token, oauth
+from utils import create_access_token, create_refresh_token, async_db_dep, current_user_dep, decode_refresh_token, get_oauth, limit_login, limit_signup, limit_refresh
 from schema import UserCreate, CurrentUser, LoginResponse, UserRetrieve, UserUpdate, UserSignup, user_update_mapper
 from exceptions import invalid_token_exception
 
 router = APIRouter()
 
 
-@router.post("/signup", response_model=LoginResponse, status_code=status.HTTP_201_CREATED)
-def signup(user: UserSignup, response: Response, db: db_dep):
-    created_user = User.create_user(db, user)
+@router.post("/signup", response_model=LoginResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_signup)])
+async def signup(user: UserSignup, response: Response, db: async_db_dep):
+    created_user = await User.create_user(db, user)
     access_token = create_access_token(data={"sub": created_user.username, "id": str(created_user.id), "role": created_user.role})
 
     refresh_token = create_refresh_token(data={"id": str(created_user.id)})
@@ -22,9 +22,9 @@ def signup(user: UserSignup, response: Response, db: db_dep):
     return LoginResponse(user=created_user, access_token=access_token, token_type="bearer")
 
 
-@router.post("/login", response_model=LoginResponse, status_code=status.HTTP_200_OK)
-def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], response: Response, db: db_dep):
-    user = User.authenticate_user(form_data.username, form_data.password, db)
+@router.post("/login", response_model=LoginResponse, status_code=status.HTTP_200_OK, dependencies=[Depends(limit_login)])
+async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], response: Response, db: async_db_dep):
+    user = await User.authenticate_user(form_data.username, form_data.password, db)
     access_token = create_access_token(data={"sub": user.username, "id": str(user.id), "role": user.role})
 
     refresh_token = create_refresh_token(data={"id": str(user.id)})
@@ -36,12 +36,14 @@ def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], response:
 @router.get("/google/login", status_code=status.HTTP_200_OK)
 async def google_login(request: Request):
     redirect_uri = request.url_for("google_callback")  # re route for method /google/callback, its defined name="google_callback" below
-    return await oauth.google.authorize_redirect(request, redirect_uri)
+    return await get_oauth().google.authorize_redirect(request, redirect_uri)
     # here the request object is sent to google to handle it and redirect back using it + redirect_uri
 
 
 @router.get("/google/callback", status_code=status.HTTP_200_OK, name="google_callback")
-async def google_callback(request: Request, db: db_dep):
+async def google_callback(request: Request, db: async_db_dep):
+    oauth = get_oauth()
+
     # 1) Get token from Google
     token = await oauth.google.authorize_access_token(request)
 
@@ -64,9 +66,9 @@ async def google_callback(request: Request, db: db_dep):
     google_id = user_info["sub"]
 
     # 4) Check if user with this google_id exists, if not -> create.
-    user = User.get_user_by_google_id(google_id, db)
+    user = await User.get_user_by_google_id(google_id, db)
     if not user:
-        user = User.create_user(
+        user = await User.create_user(
             db,
             UserCreate(
                 username=name,
@@ -96,14 +98,14 @@ def read_current_user(current_user: current_user_dep):
     return current_user
 
 
-@router.post("/refresh", response_model=LoginResponse, status_code=status.HTTP_200_OK)
-def refresh_access_token(db: db_dep, refresh_token: Annotated[str | None, Cookie()] = None):
+@router.post("/refresh", response_model=LoginResponse, status_code=status.HTTP_200_OK, dependencies=[Depends(limit_refresh)])
+async def refresh_access_token(db: async_db_dep, refresh_token: Annotated[str | None, Cookie()] = None):
     if not refresh_token:
         raise invalid_token_exception
 
     user_id = decode_refresh_token(refresh_token)
 
-    user = User.get_user(user_id, db)
+    user = await User.get_user(user_id, db)
     if user is None:
         raise invalid_token_exception
 
@@ -114,10 +116,9 @@ def refresh_access_token(db: db_dep, refresh_token: Annotated[str | None, Cookie
 @router.put("/", response_model=UserRetrieve, status_code=status.HTTP_200_OK)
 async def update_user(
         current_user: current_user_dep,
-        db: db_dep,
-        background_tasks: BackgroundTasks,
+        db: async_db_dep,
         user_update: Annotated[UserUpdate, Depends(user_update_mapper)],
         avatar: UploadFile | None = File(None),
 ):
-    updated_user = await User.update_user(current_user.id, user_update, avatar, db, background_tasks)
+    updated_user = await User.update_user(current_user.id, user_update, avatar, db)
     return updated_user
@@ -1 +1,3 @@
 from .expenses_routes import router as expenses_router
+from .events import report_events
+from .partitions import run_partition_maintenance, get_partitions_status
@@ -0,0 +1,149 @@
+"""Delivery of report status changes to the GET /reports/events streams.
+
+The writes announce their changes with pg_notify (see ExpenseReport.notify_status_events), so every app process gets
+them whichever one made the change. Each process holds a single LISTEN connection, opened with the first subscriber,
+and fans the notifications out to its subscribers in memory. A subscriber costs a queue and no database connection.
+"""
+from sqlalchemy import make_url
+from collections import defaultdict
+from typing import AsyncIterator
+from uuid import UUID
+from database import get_db_url
+from models import STATUS_EVENTS_CHANNEL
+import asyncio
+import json
+import os
+
+# LISTEN needs a session level connection: set this to a direct database URL when DATABASE_URL goes through PgBouncer
+REPORT_EVENTS_DATABASE_URL = os.environ.get("REPORT_EVENTS_DATABASE_URL")
+# Comment lines sent on idle streams, so proxies don't close them and disconnected clients are noticed
+REPORT_EVENTS_KEEPALIVE = float(os.environ.get("REPORT_EVENTS_KEEPALIVE", 15))
+# Events a stream may fall behind by before it is closed, the client reconnects and refetches its reports
+REPORT_EVENTS_QUEUE_SIZE = int(os.environ.get("REPORT_EVENTS_QUEUE_SIZE", 100))
+LISTEN_RETRY_INTERVAL = 5
+# How long browsers wait before reopening a dropped stream
+CLIENT_RETRY_MS = 5000
+
+# Sent after the LISTEN connection was lost and reestablished, changes made in between weren't delivered
+RESYNC_EVENT = ("resync", "{}")
+# Queued in place of the event that didn't fit, ends the stream
+OVERFLOW = ("overflow", "")
+
+
+class Subscription:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(maxsize=REPORT_EVENTS_QUEUE_SIZE + 1)  # + OVERFLOW
+
+    def push(self, event: tuple[str, str]) -> None:
+        if self.queue.qsize() < REPORT_EVENTS_QUEUE_SIZE:
+            self.queue.put_nowait(event)
+        elif self.queue.qsize() == REPORT_EVENTS_QUEUE_SIZE:
+            self.queue.put_nowait(OVERFLOW)
+
+
+class ReportEvents:
+    def __init__(self):
+        self.subscriptions: dict[str, set[Subscription]] = defaultdict(set)
+        self.listener: asyncio.Task | None = None
+        self.listening = False
+        self.counters = {"notifications": 0, "delivered": 0, "reconnects": 0}
+
+    def subscribe(self, user_id: UUID | str) -> Subscription:
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen())
+
+        subscription = Subscription(str(user_id))
+        self.subscriptions[subscription.user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self.subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[subscription.user_id]
+
+    def on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        self.counters["notifications"] += 1
+        # Only the owner is read here, the payload is forwarded as is
+        user_id = json.loads(payload)["user_id"]
+        for subscription in self.subscriptions.get(user_id, ()):
+            subscription.push(("status", payload))
+            self.counters["delivered"] += 1
+
+    async def listen(self) -> None:
+        """Keeps a LISTEN connection open for as long as the process runs, reconnecting when it drops."""
+        import asyncpg
+
+        url = make_url(REPORT_EVENTS_DATABASE_URL or get_db_url()).set(drivername="postgresql")
+        dsn = url.render_as_string(hide_password=False)
+        missed = False
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+                try:
+                    closed = asyncio.Event()
+                    connection.add_termination_listener(lambda _: closed.set())
+                    await connection.add_listener(STATUS_EVENTS_CHANNEL, self.on_notification)
+                    self.listening = True
+                    if missed:
+                        self.resync()
+                    await closed.wait()
+                finally:
+                    self.listening = False
+                    await connection.close()
+            except Exception as e:
+                # Any failure, asyncpg's InterfaceError included, must not end the listener for good. Cancelling it
+                # raises CancelledError, which isn't an Exception.
+                print("Report events listener failed:", repr(e))
+
+            missed = True
+            self.counters["reconnects"] += 1
+            await asyncio.sleep(LISTEN_RETRY_INTERVAL)
+
+    def resync(self) -> None:
+        for subscriptions in self.subscriptions.values():
+            for subscription in subscriptions:
+                subscription.push(RESYNC_EVENT)
+
+    async def close(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.listener = None
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "listening": self.listening,
+            "users": len(self.subscriptions),
+            "subscribers": sum(len(subscriptions) for subscriptions in self.subscriptions.values()),
+        }
+
+
+report_events = ReportEvents()
+
+
+async def stream_report_events(user_id: UUID | str) -> AsyncIterator[str]:
+    """Server-sent events of the user's report status changes. Ends when the client disconnects (the response
+    cancels it) or falls too far behind."""
+    subscription = report_events.subscribe(user_id)
+    try:
+        yield f"retry: {CLIENT_RETRY_MS}\n\n"
+        while True:
+            try:
+                event, data = await asyncio.wait_for(subscription.queue.get(), REPORT_EVENTS_KEEPALIVE)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if (event, data) == OVERFLOW:
+                yield f"event: {RESYNC_EVENT[0]}\ndata: {RESYNC_EVENT[1]}\n\n"
+                return
+            yield f"event: {event}\ndata: {data}\n\n"
+    finally:
+        report_events.unsubscribe(subscription)
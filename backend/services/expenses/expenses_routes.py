@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, status, UploadFile, File, Header, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Annotated
 from datetime import datetime
-from models import ExpenseReport
-from schema import ExpenseCreate, ExpenseRetrieve, ExpenseUpdate, expense_create_mapper, expense_update_mapper
-from services.files_service import upload_file, delete_file_by_url
-from utils import current_user_dep, db_dep
+from models import ExpenseReport, ListVersion, user_expenses_scope
+from schema import ExpenseCreate, ExpenseRetrieve, ExpenseUpdate, ExpenseImportResult, expense_create_mapper, expense_update_mapper, expense_row_list_adapter
+from services.files_service import upload_file, discard_upload
+from utils import current_user_dep, stream_user_dep, db_dep, read_db_dep, async_db_dep, AdapterJSONResponse, make_etag, etag_matches, etag_headers
+from .importer import read_import_file
+from .events import stream_report_events
 
 router = APIRouter()
 
@@ -12,47 +15,84 @@ router = APIRouter()
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=ExpenseRetrieve)
 async def create_expense_report(
         expense: Annotated[ExpenseCreate, Depends(expense_create_mapper)],
-        db: db_dep,
+        db: async_db_dep,
         current_user: current_user_dep,
         file: UploadFile | None = File(None),
 ):
 
     if file:
-        upload_link = await upload_file(file, folder="expense-reports/")
+        upload_link = await upload_file(db, file, folder="expense-reports/")
         expense.file = upload_link
 
-    new_expense = ExpenseReport.create(db, expense, current_user.id, datetime.now(), "Pending")
+    try:
+        new_expense = await ExpenseReport.create(db, expense, current_user.id, datetime.now(), "Pending")
+    except Exception:
+        if file:
+            await discard_upload(db, upload_link)
+        raise
 
     return new_expense
 
 
+@router.post("/import", status_code=status.HTTP_201_CREATED, response_model=ExpenseImportResult)
+async def import_expense_reports(db: async_db_dep, current_user: current_user_dep, file: UploadFile = File(...)):
+    """Creates many reports from a CSV file (title, amount, description columns) or a JSON array of objects with the same keys.
+    All rows are validated first, if any is invalid nothing is created and the errors are returned per row with status 422."""
+    expenses, errors = await read_import_file(file)
+    if errors:
+        result = ExpenseImportResult(created_count=0, ids=[], errors=errors)
+        return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=result.model_dump())
+
+    ids = await ExpenseReport.bulk_create(db, expenses, current_user.id, datetime.now(), "Pending") if expenses else []
+    return ExpenseImportResult(created_count=len(ids), ids=ids)
+
+
 @router.get("", response_model=list[ExpenseRetrieve], status_code=status.HTTP_200_OK)
-def get_my_expense_reports(db: db_dep, current_user: current_user_dep):
+def get_my_expense_reports(db: read_db_dep, current_user: current_user_dep, if_none_match: Annotated[str | None, Header()] = None):
+    # The version is read before the rows, a write in between can only make the ETag older than the body, never newer
+    scope = user_expenses_scope(current_user.id)
+    etag = make_etag(scope, ListVersion.get(db, scope))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+
     my_expenses = ExpenseReport.get_user_expenses(db, current_user.id)
 
-    return my_expenses
+    return AdapterJSONResponse(my_expenses, expense_row_list_adapter, headers=etag_headers(etag))
+
+
+@router.get("/events", status_code=status.HTTP_200_OK)
+async def report_events_stream(current_user: stream_user_dep):
+    """Server-sent events of the current user's reports: a `status` event (an ExpenseStatusEvent) whenever an admin changes
+    the status or comment of one of them, and `resync` when some may have been missed, after which the list should be
+    fetched again. Takes no database session, it would be held for as long as the stream is open.
+
+    Browsers open it with `new EventSource(`${API_URL}/reports/events?access_token=${token}`)`, an EventSource can't
+    send the Authorization header (which is accepted too). It reconnects with the URL it was created with, once the
+    token expires the stream answers 401 and has to be reopened with a fresh token."""
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # X-Accel-Buffering: nginx must not buffer the stream
+    return StreamingResponse(stream_report_events(current_user.id), media_type="text/event-stream", headers=headers)
 
 
 @router.put("/{expense_id}", response_model=ExpenseRetrieve, status_code=status.HTTP_200_OK)
 async def update_expense_report(
         expense_id: int,
         expense_update: Annotated[ExpenseUpdate, Depends(expense_update_mapper)],
-        db: db_dep,
+        db: async_db_dep,
         current_user: current_user_dep,
-        background_tasks: BackgroundTasks,
         file: UploadFile | None = File(None),
 ):
-    expense = ExpenseReport.check_user_expense_update_auth(db, current_user.id, expense_id)
-    old_file = expense.file
+    expense = await ExpenseReport.check_user_expense_update_auth(db, current_user.id, expense_id)
     if file:
-        upload_link = await upload_file(file, folder="expense-reports/")
+        upload_link = await upload_file(db, file, folder="expense-reports/")
         expense_update.file = upload_link
 
-    updated_expense = ExpenseReport.update_user_expense(expense, db, expense_update)
-
-    # Background task to delete the old file. It is ran only after the request is sent to user (but same process).
-    if file and old_file:
-        background_tasks.add_task(delete_file_by_url, old_file)
+    # A replaced file is queued for deletion by update_user_expense
+    try:
+        updated_expense = await ExpenseReport.update_user_expense(expense, db, expense_update)
+    except Exception:
+        if file:
+            await discard_upload(db, upload_link)
+        raise
 
     return updated_expense
 
@@ -62,6 +102,5 @@ def delete_my_expense_report(
     expense_id: int,
     db: db_dep,
     current_user: current_user_dep,
-    background_tasks: BackgroundTasks,
 ):
-    ExpenseReport.delete_user_expense(db, current_user.id, expense_id, background_tasks)
+    ExpenseReport.delete_user_expense(db, current_user.id, expense_id)
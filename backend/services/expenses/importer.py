@@ -0,0 +1,67 @@
+from fastapi import UploadFile
+from pydantic import TypeAdapter, ValidationError
+from schema import ExpenseCreate, ExpenseImportError
+from typing import BinaryIO
+from itertools import islice
+from services.files_service import MAX_UPLOAD_SIZE
+from exceptions import invalid_import_file_exception, import_too_large_exception, file_too_large_exception
+import asyncio
+import csv
+import io
+import json
+import os
+
+MAX_IMPORT_ROWS = int(os.environ.get("MAX_IMPORT_ROWS", 10000))
+IMPORT_FIELDS = ("title", "amount", "description")
+
+expense_create_list_adapter = TypeAdapter(list[ExpenseCreate])
+
+
+def parse_rows(file: BinaryIO, filename: str | None) -> list[dict]:
+    """Reads the rows of a CSV file, or of a JSON array of objects when filename ends with .json. A CSV file is read row
+    by row and only up to the first row past MAX_IMPORT_ROWS."""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        if filename and filename.lower().endswith(".json"):
+            rows = json.load(text)
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise invalid_import_file_exception
+        else:
+            rows = list(islice(csv.DictReader(text), MAX_IMPORT_ROWS + 1))
+    except (UnicodeDecodeError, json.JSONDecodeError, csv.Error):
+        raise invalid_import_file_exception
+    finally:
+        # Leaves the file open, it belongs to the caller
+        text.detach()
+
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise import_too_large_exception
+
+    # Only the fields a user can set through POST /reports. An empty CSV cell means no value, other values (a JSON 0
+    # or false included) are left for validation.
+    return [{key: empty_to_none(row.get(key)) for key in IMPORT_FIELDS} for row in rows]
+
+
+def empty_to_none(value):
+    return None if value == "" else value
+
+
+def validate_rows(rows: list[dict]) -> tuple[list[ExpenseCreate], list[ExpenseImportError]]:
+    """Validates all rows in one pydantic-core call. Returns the expenses, or the errors per row (1-based) if any row is invalid."""
+    try:
+        return expense_create_list_adapter.validate_python(rows), []
+    except ValidationError as e:
+        row_errors: dict[int, list[str]] = {}
+        for error in e.errors():
+            row, *field = error["loc"]
+            row_errors.setdefault(row + 1, []).append(f"{'.'.join(map(str, field))}: {error['msg']}")
+        return [], [ExpenseImportError(row=row, errors=errors) for row, errors in sorted(row_errors.items())]
+
+
+async def read_import_file(file: UploadFile) -> tuple[list[ExpenseCreate], list[ExpenseImportError]]:
+    """Parses the spooled upload in place rather than reading it into memory first. Like receipts, it is at most
+    MAX_UPLOAD_SIZE (UploadSizeLimitMiddleware already refuses larger request bodies)."""
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise file_too_large_exception
+    # Parsing and validating thousands of rows is CPU work, keep it off the event loop.
+    return await asyncio.to_thread(lambda: validate_rows(parse_rows(file.file, file.filename)))
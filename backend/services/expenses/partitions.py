@@ -0,0 +1,247 @@
+"""Monthly partitions of expense_reports and the archival of closed periods.
+
+expense_reports is range partitioned on date (migration 0008), one partition per month: expense_reports_y2026m10
+holds October 2026. Queries on recent months, like the listings' month filter or the first pages of the keyset
+pagination, only read the partitions of those months however much history the table holds. Partitions are created
+PARTITION_MONTHS_AHEAD months in advance; reports dated outside every partition land in expense_reports_default and
+are moved to their month's partition when it is created.
+
+A month is closed ARCHIVE_AFTER_MONTHS months after it ended. Once it has no pending report left, its reports are
+moved into expense_reports_archive, the cold partition of everything older (from MINVALUE), and its partition is
+dropped. The archive is still a partition of expense_reports: the ORM and the routes read and update archived reports
+as before, and nothing but the admin endpoints knows about the partitions.
+
+Every app process runs run_partition_maintenance, which does both; one process at a time gets through. Run it once
+from the backend/ directory with: python -m services.expenses.partitions
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from database import new_async_session
+from models import ExpenseReport
+import asyncio
+import re
+import os
+
+PARTITION_MONTHS_AHEAD = int(os.environ.get("EXPENSE_PARTITION_MONTHS_AHEAD", 3))
+# 0 turns the archival off
+ARCHIVE_AFTER_MONTHS = int(os.environ.get("EXPENSE_ARCHIVE_AFTER_MONTHS", 12))
+PARTITION_MAINTENANCE_INTERVAL = float(os.environ.get("EXPENSE_PARTITION_MAINTENANCE_INTERVAL", 3600))
+# Attaching and detaching partitions locks expense_reports: give up when the lock isn't granted within this time
+# rather than have every query queue behind the waiting DDL, the next run tries again.
+PARTITION_LOCK_TIMEOUT = os.environ.get("EXPENSE_PARTITION_LOCK_TIMEOUT", "5s")
+
+TABLE = ExpenseReport.__tablename__
+ARCHIVE = f"{TABLE}_archive"
+DEFAULT = f"{TABLE}_default"
+# search_vector is generated, it can't be inserted
+COLUMNS = ", ".join(column.name for column in ExpenseReport.__table__.columns if column.computed is None)
+# Lets the next archive bound be checked ahead of the move, see archive_month
+ARCHIVE_BOUND_CONSTRAINT = f"{ARCHIVE}_next_bound"
+# pg_try_advisory_xact_lock key of the maintenance transactions
+MAINTENANCE_LOCK = 0x65787072
+
+PARTITIONS = text("""
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples, pg_total_relation_size(c.oid)
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:table AS regclass)
+""")
+BOUND = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+# Counters since this process started, the partitions themselves are listed by get_partitions
+maintenance_stats = {"runs": 0, "created": 0, "archived": 0, "failed": 0}
+
+
+@dataclass
+class Partition:
+    name: str
+    start: datetime | None  # None from MINVALUE
+    end: datetime | None  # None for the default partition
+    rows: int | None  # Postgres' estimate, None before the partition is first analyzed
+    size_bytes: int
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_start(day: datetime) -> datetime:
+    return datetime(day.year, day.month, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def bound_value(value: str) -> datetime | None:
+    return None if value == "MINVALUE" else datetime.fromisoformat(value.strip("'"))
+
+
+def literal(value: datetime) -> str:
+    # DDL takes no bound parameters. The value is a datetime, its ISO form is safe to inline.
+    return f"'{value.isoformat(sep=' ')}'"
+
+
+async def get_partitions(db: AsyncSession) -> list[Partition]:
+    """The partitions of expense_reports in date order, the default one last."""
+    partitions = []
+    for name, bound, rows, size_bytes in (await db.execute(PARTITIONS, {"table": TABLE})).all():
+        match = BOUND.search(bound)
+        start, end = (bound_value(match[1]), bound_value(match[2])) if match else (None, None)
+        partitions.append(Partition(name, start, end, int(rows) if rows >= 0 else None, size_bytes))
+    return sorted(partitions, key=lambda p: (p.end is None, p.start or datetime.min))
+
+
+async def begin_maintenance(db: AsyncSession) -> bool:
+    """Starts a maintenance transaction, False if another process is in one."""
+    await db.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+    return await db.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK})
+
+
+async def create_partition(db: AsyncSession, month: datetime) -> None:
+    """Adds the partition of month, with the reports of that month that were stored in the default partition.
+
+    Created as a standalone table and then attached, which doesn't block the queries on expense_reports the way
+    CREATE TABLE ... PARTITION OF does."""
+    name, start, end = partition_name(month), literal(month), literal(add_months(month, 1))
+    await db.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)"))
+    await db.execute(text(f"""
+        WITH moved AS (DELETE FROM {DEFAULT} WHERE date >= {start} AND date < {end} RETURNING {COLUMNS})
+        INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM moved
+    """))
+    await db.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})"))
+
+
+async def create_partitions(db: AsyncSession, today: datetime) -> list[str]:
+    """Creates the missing partitions of this month and the PARTITION_MONTHS_AHEAD next ones, and of every month with
+    reports in the default partition (past months too, when maintenance didn't run for a while). Returns their names."""
+    if not await begin_maintenance(db):
+        await db.rollback()
+        return []
+
+    existing = {partition.start for partition in await get_partitions(db)}
+    months = {add_months(month_start(today), months) for months in range(PARTITION_MONTHS_AHEAD + 1)}
+    months.update(await db.scalars(text(f"SELECT DISTINCT date_trunc('month', date) FROM {DEFAULT}")))
+    created = []
+    for month in sorted(months - existing):
+        await create_partition(db, month)
+        created.append(partition_name(month))
+    await db.commit()
+    return created
+
+
+async def has_pending(db: AsyncSession, month: Partition | None, start: datetime, end: datetime) -> bool:
+    """Whether the month from start to end has pending reports, in its partition or in the default one when it has none."""
+    if month is not None:
+        return await db.scalar(text(f"SELECT EXISTS (SELECT FROM {month.name} WHERE status = 'PENDING')"))
+    return await db.scalar(text(f"SELECT EXISTS (SELECT FROM {DEFAULT} WHERE date >= {literal(start)} AND date < {literal(end)} AND status = 'PENDING')"))
+
+
+async def archive_month(db: AsyncSession, month: Partition | None, end: datetime) -> bool:
+    """Moves the reports of the month right after the archive into it and drops the month's partition (None when
+    there is none, the archive then grows over the month and takes its reports from the default partition). Returns
+    False when the month still has pending reports, or another process is doing maintenance.
+
+    Reattaching the archive with its new bound must check that every archived report is below the bound, a scan of
+    the whole archive. That is done first, in its own transactions, by validating a CHECK constraint stating it,
+    which doesn't block reads or writes. ATTACH PARTITION then relies on the constraint and skips the scan, so
+    expense_reports is only locked for as long as moving one month takes."""
+    start = add_months(end, -1)
+    if await has_pending(db, month, start, end):
+        return False
+
+    bound = literal(end)
+    if not await begin_maintenance(db):
+        await db.rollback()
+        return False
+    await db.execute(text(f"ALTER TABLE {ARCHIVE} DROP CONSTRAINT IF EXISTS {ARCHIVE_BOUND_CONSTRAINT}"))
+    await db.execute(text(f"ALTER TABLE {ARCHIVE} ADD CONSTRAINT {ARCHIVE_BOUND_CONSTRAINT} CHECK (date < {bound}) NOT VALID"))
+    await db.commit()
+    await db.execute(text(f"ALTER TABLE {ARCHIVE} VALIDATE CONSTRAINT {ARCHIVE_BOUND_CONSTRAINT}"))
+    await db.commit()
+
+    if not await begin_maintenance(db):
+        await db.rollback()
+        return False
+    if month is not None:
+        await db.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {month.name}"))
+    await db.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {ARCHIVE}"))
+    # Checked again now that no report of the month can change anymore
+    if await has_pending(db, month, start, end):
+        await db.rollback()
+        return False
+    if month is not None:
+        await db.execute(text(f"INSERT INTO {ARCHIVE} ({COLUMNS}) SELECT {COLUMNS} FROM {month.name}"))
+        await db.execute(text(f"DROP TABLE {month.name}"))
+    else:
+        # Attaching the archive over the month fails while the default partition has reports of it
+        await db.execute(text(f"""
+            WITH moved AS (DELETE FROM {DEFAULT} WHERE date >= {literal(start)} AND date < {literal(end)} RETURNING {COLUMNS})
+            INSERT INTO {ARCHIVE} ({COLUMNS}) SELECT {COLUMNS} FROM moved
+        """))
+    await db.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {ARCHIVE} FOR VALUES FROM (MINVALUE) TO ({bound})"))
+    await db.execute(text(f"ALTER TABLE {ARCHIVE} DROP CONSTRAINT {ARCHIVE_BOUND_CONSTRAINT}"))
+    await db.commit()
+    return True
+
+
+async def archive_closed_months(db: AsyncSession, today: datetime) -> list[str]:
+    """Archives the closed months oldest first, up to the first one with a pending report, the archive only covers
+    a continuous range. Returns the months archived, as YYYY-MM."""
+    closed_before = add_months(month_start(today), -ARCHIVE_AFTER_MONTHS)
+    archived = []
+    while True:
+        partitions = await get_partitions(db)
+        archive_end = next((partition.end for partition in partitions if partition.name == ARCHIVE), None)
+        if archive_end is None:
+            print(f"Partition maintenance: {ARCHIVE} isn't a partition of {TABLE}, closed months aren't archived.")
+            break
+        if archive_end >= closed_before:
+            break
+        month = next((partition for partition in partitions if partition.start == archive_end), None)
+        if not await archive_month(db, month, add_months(archive_end, 1)):
+            break
+        archived.append(archive_end.strftime("%Y-%m"))
+    return archived
+
+
+async def maintain_partitions(db: AsyncSession, today: datetime | None = None) -> dict:
+    today = today or datetime.now()
+    created = await create_partitions(db, today)
+    archived = await archive_closed_months(db, today) if ARCHIVE_AFTER_MONTHS > 0 else []
+    maintenance_stats["runs"] += 1
+    maintenance_stats["created"] += len(created)
+    maintenance_stats["archived"] += len(archived)
+    return {"created": created, "archived": archived}
+
+
+async def run_partition_maintenance() -> None:
+    """Maintains the partitions at startup and then every PARTITION_MAINTENANCE_INTERVAL seconds."""
+    while True:
+        try:
+            async with new_async_session() as db:
+                result = await maintain_partitions(db)
+            if result["created"] or result["archived"]:
+                print("Expense report partitions:", result)
+        except Exception as e:
+            # A lock timeout or an outage, the next run tries again
+            print("Partition maintenance failed:", repr(e))
+            maintenance_stats["failed"] += 1
+
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+
+async def get_partitions_status(db: AsyncSession) -> dict:
+    partitions = [asdict(partition) for partition in await get_partitions(db)]
+    return {"partitions": partitions, "maintenance": maintenance_stats}
+
+
+async def main() -> None:
+    async with new_async_session() as db:
+        print(await maintain_partitions(db))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1 +1,4 @@
-from .helpers import upload_file, configure_cloudinary, delete_file_by_url
+from .helpers import upload_file, discard_upload
+from .storage import Storage, CloudinaryStorage, LocalStorage, configure_storage, get_storage, call_storage
+from .limits import UploadSizeLimitMiddleware, MAX_UPLOAD_SIZE
+from .deletion_worker import run_deletion_worker, process_deletion_batch, worker_stats
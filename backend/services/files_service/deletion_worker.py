@@ -0,0 +1,75 @@
+from database import new_async_session
+from models import StoredFile, FileDeletion
+from .storage import call_storage
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+FILE_DELETION_BATCH_SIZE = int(os.environ.get("FILE_DELETION_BATCH_SIZE", 100))
+FILE_DELETION_POLL_INTERVAL = float(os.environ.get("FILE_DELETION_POLL_INTERVAL", 5))
+
+# Counters since this process started, the queue itself is reported by FileDeletion.queue_stats
+worker_stats = {"batches": 0, "failed_batches": 0, "deleted": 0, "released": 0, "reused": 0, "failed_attempts": 0}
+
+
+async def process_deletion_batch() -> int:
+    """Deletes one batch of queued files from storage, returns how many queue entries were handled.
+
+    Runs in a single transaction: if the process dies halfway, the claimed rows and reference counts roll back and the
+    batch is retried (deleting an already deleted file is a no-op)."""
+    async with new_async_session() as db:
+        deletions = await FileDeletion.claim_batch(db, FILE_DELETION_BATCH_SIZE)
+        if not deletions:
+            return 0
+
+        # The reference is dropped on the first attempt only, retried rows already got to zero. Since then the same
+        # content may have been uploaded again, which registers the same URL: the file is in use, don't delete it.
+        retried_urls = {deletion.url for deletion in deletions if deletion.attempts > 0}
+        reused_urls = await StoredFile.registered_urls(db, retried_urls) if retried_urls else set()
+
+        to_delete = []
+        for deletion in deletions:
+            if deletion.attempts == 0 and not await StoredFile.release(db, deletion.url):
+                await db.delete(deletion)
+                worker_stats["released"] += 1
+            elif deletion.attempts > 0 and deletion.url in reused_urls:
+                await db.delete(deletion)
+                worker_stats["reused"] += 1
+            else:
+                to_delete.append(deletion)
+
+        if to_delete:
+            try:
+                results = await call_storage("delete_many", list({deletion.url for deletion in to_delete}))
+                error = "Storage refused the deletion."
+            except Exception as e:
+                results, error = {}, repr(e)
+
+            for deletion in to_delete:
+                if results.get(deletion.url):
+                    await db.delete(deletion)
+                    worker_stats["deleted"] += 1
+                else:
+                    deletion.retry_later(error)
+                    worker_stats["failed_attempts"] += 1
+
+        await db.commit()
+        worker_stats["batches"] += 1
+        return len(deletions)
+
+
+async def run_deletion_worker() -> None:
+    """Drains the queue, back to back while there is a backlog, otherwise every FILE_DELETION_POLL_INTERVAL seconds."""
+    while True:
+        try:
+            handled = await process_deletion_batch()
+        except Exception:
+            # Keep the worker alive through database outages, the rows stay queued
+            logger.exception("File deletion batch failed")
+            worker_stats["failed_batches"] += 1
+            handled = 0
+
+        if handled < FILE_DELETION_BATCH_SIZE:
+            await asyncio.sleep(FILE_DELETION_POLL_INTERVAL)
@@ -1,39 +1,55 @@
 from fastapi import UploadFile
-import cloudinary
-import cloudinary.uploader
-import re
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import BinaryIO
+from sqlalchemy.exc import SQLAlchemyError
+from models import StoredFile, FileDeletion
+from .limits import check_upload
+from .storage import call_storage
+import hashlib
 import asyncio
+import logging
 
+logger = logging.getLogger(__name__)
 
-def configure_cloudinary(url: str):
-    cloudinary.config(cloudinary_url=url)
 
+def hash_file(file: BinaryIO, folder: str) -> str:
+    """SHA-256 of the folder and the file's content. The same content uploaded to two folders is two stored files,
+    each upload gets back a URL in its own folder."""
+    digest = hashlib.sha256(folder.encode() + b"\0")
+    for chunk in iter(lambda: file.read(1024 * 1024), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
 
-async def upload_file(file: UploadFile, folder: str) -> str:
-    content = await file.read()
 
-    result = await asyncio.to_thread(cloudinary.uploader.upload, content, resource_type="auto", folder=folder)
-    return result["secure_url"]
+async def upload_file(db: AsyncSession, file: UploadFile, folder: str) -> str:
+    """Stores the file and returns its URL. Content that is already stored is only referenced again, without uploading it.
+    Uploads stream from the request's spooled temporary file instead of reading it all into memory.
 
+    Runs on the caller's session rather than its own, so a request never holds two pooled connections at once (with as
+    many concurrent uploads as the pool has connections, each would wait for a second one forever). The file's reference
+    is committed right away, the caller must not have pending changes, and must call discard_upload if the change that
+    was to use the file fails.
 
-async def delete_file_by_url(file_url: str) -> None:
-    """Given Cloudinary file URL, delete the file from Cloudinary. Keep in mind that it only works if the file was in a single file folder."""
-    # URL example: https://res.cloudinary.com/dsukbbn7k/image/upload/v1756847618/expense-reports/jfagjdljlt1jcfesrtfb.png
+    To delete a file, queue a models.FileDeletion instead, see deletion_worker."""
+    check_upload(file)
 
-    # Regex to capture the part between '/upload/' and extension, ingoring versioning (v1756847618)
-    match = re.search(r'/upload/(?:v\d+/)?([^\.]+)', file_url)
-    if not match:
-        return None
+    content_hash = await asyncio.to_thread(hash_file, file.file, folder)
+    url = await StoredFile.acquire(db, content_hash)
+    if url is not None:
+        return url
 
-    public_id = match.group(1)
-    result = await asyncio.to_thread(
-        cloudinary.uploader.destroy,
-        public_id,
-        resource_type="image",
-    )
+    url = await call_storage("upload", file.file, content_hash, folder, file.filename)
+    return await StoredFile.register(db, content_hash, url)
 
-    # logging for debugging, since it'll be running as a background task
-    if result.get("result") != "ok":
-        print("Failed to delete file:", result)
 
-    return result
+async def discard_upload(db: AsyncSession, url: str) -> None:
+    """Releases the reference upload_file took, after the change that was to use the file failed (and was rolled back).
+    The deletion worker then deletes the file, unless something else references the same content."""
+    db.add(FileDeletion(url=url))
+    try:
+        await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        # Leaves a reference nothing uses, the file is kept
+        logger.warning("Couldn't queue the release of the unused upload %s", url, exc_info=True)
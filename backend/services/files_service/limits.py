@@ -0,0 +1,80 @@
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+from exceptions import file_too_large_exception, unsupported_file_type_exception
+import os
+
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 10 * 1024 * 1024))
+# Room for the other form fields sent along with the file
+MAX_MULTIPART_BODY_SIZE = MAX_UPLOAD_SIZE + 64 * 1024
+
+# Leading bytes of the accepted receipt/avatar formats
+FILE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"GIF87a": "image/gif",
+    b"GIF89a": "image/gif",
+    b"%PDF-": "application/pdf",
+}
+
+
+def sniff_content_type(head: bytes) -> str | None:
+    for signature, content_type in FILE_SIGNATURES.items():
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1"):
+        return "image/heic"
+    return None
+
+
+def check_upload(file: UploadFile) -> None:
+    """Rejects files over MAX_UPLOAD_SIZE or whose content isn't one of the accepted formats, before anything is uploaded.
+    Looks at the file's leading bytes rather than the client supplied content type."""
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise file_too_large_exception
+
+    head = file.file.read(16)
+    file.file.seek(0)
+    if sniff_content_type(head) is None:
+        raise unsupported_file_type_exception
+
+
+class UploadSizeLimitMiddleware:
+    """Rejects multipart requests whose body is larger than max_body_size while it is being received, so an oversized
+    upload is refused from its Content-Length header, or as soon as the limit is crossed, instead of after being spooled."""
+
+    def __init__(self, app: ASGIApp, max_body_size: int = MAX_MULTIPART_BODY_SIZE):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = headers.get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = JSONResponse({"detail": file_too_large_exception.detail}, status_code=file_too_large_exception.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise file_too_large_exception
+            return message
+
+        await self.app(scope, limited_receive, send)
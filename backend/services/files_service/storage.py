@@ -0,0 +1,146 @@
+from abc import ABC, abstractmethod
+from typing import BinaryIO
+from pathlib import Path
+from time import perf_counter
+from metrics import observe_storage_call
+import asyncio
+import shutil
+import re
+import os
+
+# Files are sent to Cloudinary in parts of this size, which bounds the memory an upload needs. Cloudinary's minimum is 5 MB.
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 6 * 1024 * 1024))
+
+
+class Storage(ABC):
+    """Where uploaded files are kept. Methods are blocking, call them through asyncio.to_thread.
+
+    key is the hash of the folder and content of the file, so uploading the same content under the same folder always maps
+    to the same object."""
+
+    @abstractmethod
+    def upload(self, file: BinaryIO, key: str, folder: str, filename: str | None) -> str:
+        """Stores the file and returns its public URL."""
+
+    @abstractmethod
+    def delete(self, url: str) -> bool:
+        """Deletes the file at url, returns whether it is gone (also when it didn't exist)."""
+
+    def delete_many(self, urls: list[str]) -> dict[str, bool]:
+        """Deletes several files, returns for each url whether it is gone. Backends with a batch API override this."""
+        return {url: self.delete(url) for url in urls}
+
+
+class CloudinaryStorage(Storage):
+    def __init__(self, url: str | None):
+        # The SDK is only imported when this backend is used, it's a large import the local backend doesn't need
+        import cloudinary
+
+        cloudinary.config(cloudinary_url=url)
+
+    def upload(self, file: BinaryIO, key: str, folder: str, filename: str | None) -> str:
+        import cloudinary.uploader
+
+        result = cloudinary.uploader.upload_large(
+            file,
+            public_id=key,
+            overwrite=False,
+            resource_type="auto",
+            folder=folder,
+            filename=filename,
+            chunk_size=UPLOAD_CHUNK_SIZE,
+        )
+        return result["secure_url"]
+
+    @staticmethod
+    def public_id(url: str) -> str | None:
+        """Keep in mind that it only works if the file was in a single file folder."""
+        # URL example: https://res.cloudinary.com/dsukbbn7k/image/upload/v1756847618/expense-reports/jfagjdljlt1jcfesrtfb.png
+
+        # Regex to capture the part between '/upload/' and extension, ingoring versioning (v1756847618)
+        match = re.search(r'/upload/(?:v\d+/)?([^\.]+)', url)
+        return match.group(1) if match else None
+
+    def delete(self, url: str) -> bool:
+        return self.delete_many([url])[url]
+
+    def delete_many(self, urls: list[str]) -> dict[str, bool]:
+        """Deletes up to 100 files per Admin API call."""
+        import cloudinary.api
+
+        public_ids = {url: self.public_id(url) for url in urls}
+        results = {url: public_id is None for url, public_id in public_ids.items()}  # Nothing to delete for foreign URLs
+
+        to_delete = [public_id for public_id in public_ids.values() if public_id is not None]
+        deleted = {}
+        for i in range(0, len(to_delete), 100):
+            deleted.update(cloudinary.api.delete_resources(to_delete[i:i + 100], resource_type="image")["deleted"])
+
+        for url, public_id in public_ids.items():
+            if public_id is not None:
+                results[url] = deleted.get(public_id) in ("deleted", "not_found")
+        return results
+
+
+class LocalStorage(Storage):
+    """Keeps files in a local directory, served by the app under /files. For development, offline use and tests."""
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = Path(directory).resolve()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url.rstrip("/")
+
+    def upload(self, file: BinaryIO, key: str, folder: str, filename: str | None) -> str:
+        suffix = Path(filename).suffix.lower() if filename else ""
+        if not re.fullmatch(r"\.[a-z0-9]{1,5}", suffix):
+            suffix = ""
+
+        relative_path = f"{folder.strip('/')}/{key}{suffix}"
+        path = self.directory / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists():
+            with open(path, "wb") as destination:
+                shutil.copyfileobj(file, destination)
+
+        return f"{self.base_url}/{relative_path}"
+
+    def delete(self, url: str) -> bool:
+        if not url.startswith(self.base_url + "/"):
+            return True  # Not stored here, e.g. a Google avatar
+
+        path = (self.directory / url.removeprefix(self.base_url + "/")).resolve()
+        if not path.is_relative_to(self.directory):
+            return False
+
+        path.unlink(missing_ok=True)
+        return True
+
+
+storage: Storage | None = None
+
+
+def configure_storage() -> Storage:
+    """Sets up the backend named by STORAGE_BACKEND, "cloudinary" (default) or "local"."""
+    global storage
+    if os.environ.get("STORAGE_BACKEND", "cloudinary") == "local":
+        storage = LocalStorage(
+            os.environ.get("LOCAL_STORAGE_DIR", "uploads"),
+            os.environ.get("LOCAL_STORAGE_BASE_URL", "http://localhost:8000/files"),
+        )
+    else:
+        storage = CloudinaryStorage(os.environ.get("CLOUDINARY_URL"))
+    return storage
+
+
+def get_storage() -> Storage:
+    return storage or configure_storage()
+
+
+async def call_storage(operation: str, *args):
+    """Runs a blocking Storage method ("upload", "delete_many"...) in a thread, timed for the /metrics endpoint."""
+    backend = get_storage()
+    started = perf_counter()
+    try:
+        return await asyncio.to_thread(getattr(backend, operation), *args)
+    finally:
+        observe_storage_call(type(backend).__name__, operation, perf_counter() - started)
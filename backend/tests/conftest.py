@@ -0,0 +1,17 @@
+"""The app's modules read their settings from the environment when imported. These are the settings the tests run
+with, set before any of them is imported; none of the tests connects to a database.
+
+Run from the backend/ directory with: python -m pytest
+"""
+import os
+import sys
+
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://postgres@127.0.0.1:5432/expenses")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("SESSION_SECRET_KEY", "test-session-secret")
+os.environ.setdefault("STORAGE_BACKEND", "local")
+os.environ.setdefault("FILE_DELETION_WORKER", "false")
+os.environ.setdefault("EXPENSE_PARTITION_MAINTENANCE", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,44 @@
+from services.files_service import deletion_worker
+import asyncio
+import logging
+import pytest
+
+
+def test_failed_batches_are_logged_and_counted(monkeypatch, caplog):
+    calls = 0
+
+    async def failing_batch():
+        nonlocal calls
+        calls += 1
+        if calls > 1:
+            raise asyncio.CancelledError
+        raise ConnectionError("database is down")
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(deletion_worker, "process_deletion_batch", failing_batch)
+    monkeypatch.setattr(deletion_worker.asyncio, "sleep", no_sleep)
+    monkeypatch.setitem(deletion_worker.worker_stats, "failed_batches", 0)
+
+    with caplog.at_level(logging.ERROR, logger=deletion_worker.__name__), pytest.raises(asyncio.CancelledError):
+        asyncio.run(deletion_worker.run_deletion_worker())
+
+    assert deletion_worker.worker_stats["failed_batches"] == 1
+    [record] = caplog.records
+    assert record.exc_info[0] is ConnectionError
+
+
+def test_retries_back_off_exponentially():
+    from models import FileDeletion
+    from models.file_models import FILE_DELETION_BASE_BACKOFF
+    from datetime import datetime, timedelta
+
+    deletion = FileDeletion(url="http://localhost:8000/files/a.png", attempts=0)
+    for attempt in range(1, 4):
+        before = datetime.now()
+        deletion.retry_later("Storage refused the deletion.")
+        delay = timedelta(seconds=FILE_DELETION_BASE_BACKOFF * 2 ** (attempt - 1))
+        assert deletion.attempts == attempt
+        assert before + delay <= deletion.next_attempt_at <= datetime.now() + delay
+    assert deletion.last_error == "Storage refused the deletion."
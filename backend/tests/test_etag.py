@@ -0,0 +1,25 @@
+from utils import make_etag, etag_matches, etag_headers
+
+
+def test_etags_depend_on_the_scope_and_every_version():
+    etag = make_etag("user:1", 3)
+    assert etag.startswith('"') and etag.endswith('"') and len(etag) == 34
+    assert etag == make_etag("user:1", 3)
+    assert etag != make_etag("user:2", 3)
+    assert etag != make_etag("user:1", 4)
+    assert make_etag("all", 1, 2) != make_etag("all", 2, 1)
+
+
+def test_if_none_match_uses_the_weak_comparison():
+    etag = make_etag("user:1", 3)
+    assert etag_matches(etag, etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+    assert not etag_matches(make_etag("user:1", 2), etag)
+
+
+def test_responses_are_revalidated():
+    assert etag_headers('"x"') == {"ETag": '"x"', "Cache-Control": "private, no-cache"}
@@ -0,0 +1,79 @@
+from fastapi import HTTPException
+from services.expenses import importer
+from services.expenses.importer import parse_rows, validate_rows
+import io
+import pytest
+
+
+def read(content: bytes, filename: str = "reports.csv") -> tuple[list, list]:
+    return validate_rows(parse_rows(io.BytesIO(content), filename))
+
+
+def test_csv_rows_are_validated():
+    expenses, errors = read(b"title,amount,description\r\nTaxi,12.5,\r\nHotel,80,Two nights\r\n")
+    assert errors == []
+    assert [(e.title, e.amount, e.description) for e in expenses] == [("Taxi", 12.5, None), ("Hotel", 80.0, "Two nights")]
+
+
+def test_csv_byte_order_mark_is_skipped():
+    expenses, errors = read("﻿title,amount\nTaxi,3\n".encode())
+    assert errors == [] and expenses[0].title == "Taxi"
+
+
+def test_json_rows_keep_falsy_values_for_validation():
+    expenses, errors = read(b'[{"title": "Taxi", "amount": 0, "description": ""}]', "reports.json")
+    assert errors == []
+    assert (expenses[0].amount, expenses[0].description) == (0.0, None)
+
+
+def test_unknown_columns_are_ignored():
+    expenses, errors = read(b"title,amount,status\nTaxi,3,Approved\n")
+    assert errors == [] and len(expenses) == 1
+
+
+def test_errors_are_reported_per_row():
+    expenses, errors = read(b"title,amount\nTaxi,3\n,abc\n")
+    assert expenses == []
+    assert [error.row for error in errors] == [2]
+    assert any(message.startswith("amount:") for message in errors[0].errors)
+    assert any(message.startswith("title:") for message in errors[0].errors)
+
+
+@pytest.mark.parametrize("amount", [b"nan", b"inf", b"-inf", b"NaN", b"1e400"])
+def test_non_finite_csv_amounts_are_rejected(amount):
+    expenses, errors = read(b"title,amount\nTaxi,3\nHotel," + amount + b"\n")
+    assert expenses == []
+    assert [error.row for error in errors] == [2]
+
+
+def test_non_finite_json_amounts_are_rejected():
+    # json parses 1e400 to inf, NaN and Infinity are accepted by Python's json as well
+    expenses, errors = read(b'[{"title": "a", "amount": 1e400}, {"title": "b", "amount": NaN}, {"title": "c", "amount": -Infinity}]', "r.json")
+    assert expenses == []
+    assert [error.row for error in errors] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("content, filename", [
+    (b"\xff\xfe\x00", "reports.csv"),
+    (b'{"title": "Taxi"}', "reports.json"),
+    (b"[1, 2]", "reports.json"),
+    (b"[", "reports.json"),
+])
+def test_invalid_files_are_rejected(content, filename):
+    with pytest.raises(HTTPException) as e:
+        read(content, filename)
+    assert e.value.status_code == 400
+
+
+def test_too_many_rows_are_rejected(monkeypatch):
+    monkeypatch.setattr(importer, "MAX_IMPORT_ROWS", 2)
+    assert len(read(b"title,amount\na,1\nb,2\n")[0]) == 2
+    with pytest.raises(HTTPException) as e:
+        read(b"title,amount\na,1\nb,2\nc,3\n")
+    assert e.value.status_code == 413
+
+
+def test_the_file_is_left_open():
+    file = io.BytesIO(b"title,amount\na,1\n")
+    parse_rows(file, "reports.csv")
+    assert not file.closed
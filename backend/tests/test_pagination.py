@@ -0,0 +1,67 @@
+from fastapi import HTTPException
+from pydantic import ValidationError
+from schema import ExpenseFilter, month_range
+from utils import encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor
+from datetime import datetime
+import base64
+import string
+import pytest
+
+
+@pytest.mark.parametrize("year, month, start, end", [
+    (2026, 1, datetime(2026, 1, 1), datetime(2026, 2, 1)),
+    (2026, 10, datetime(2026, 10, 1), datetime(2026, 11, 1)),
+    (2026, 12, datetime(2026, 12, 1), datetime(2027, 1, 1)),
+    (2024, 2, datetime(2024, 2, 1), datetime(2024, 3, 1)),
+    (9998, 12, datetime(9998, 12, 1), datetime(9999, 1, 1)),
+])
+def test_month_range(year, month, start, end):
+    assert month_range(year, month) == (start, end)
+
+
+@pytest.mark.parametrize("date", [datetime(2026, 10, 18, 9, 30, 0, 120000), datetime(2026, 10, 18)])
+def test_cursor_round_trip(date):
+    cursor = encode_cursor(date, 42)
+    assert decode_cursor(cursor) == (date, 42)
+    # Safe in a query string as is
+    assert set(cursor) <= set(string.ascii_letters + string.digits + "-_=")
+
+
+@pytest.mark.parametrize("rank", [0.0, 0.0607927, 1 / 3, 1e-20])
+def test_search_cursor_round_trip_keeps_the_exact_rank(rank):
+    assert decode_search_cursor(encode_search_cursor(rank, 7)) == (rank, 7)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"2026-10-18T09:30:00").decode(),  # No id
+    base64.urlsafe_b64encode(b"yesterday|42").decode(),
+    base64.urlsafe_b64encode(b"2026-10-18T09:30:00|x").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),
+])
+def test_invalid_cursors_are_refused(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_invalid_search_cursor_is_refused():
+    with pytest.raises(HTTPException):
+        decode_search_cursor(base64.urlsafe_b64encode(b"high|1").decode())
+
+
+@pytest.mark.parametrize("values, has_conditions", [
+    ({}, False),
+    ({"year": 2025}, False),
+    ({"month": 3}, True),
+    ({"status": "Pending"}, True),
+    ({"min_amount": 0}, True),
+])
+def test_filter_conditions(values, has_conditions):
+    assert ExpenseFilter(**values).has_conditions() is has_conditions
+
+
+@pytest.mark.parametrize("values", [{"month": 13}, {"month": -1}, {"year": 1969}, {"year": 9999}, {"title": "Taxi"}])
+def test_invalid_filters_are_refused(values):
+    with pytest.raises(ValidationError):
+        ExpenseFilter(**values)
@@ -0,0 +1,42 @@
+from services.expenses.partitions import BOUND, add_months, month_start, partition_name, bound_value, literal
+from datetime import datetime
+import pytest
+
+
+@pytest.mark.parametrize("month, months, expected", [
+    (datetime(2026, 10, 1), 0, datetime(2026, 10, 1)),
+    (datetime(2026, 10, 1), 2, datetime(2026, 12, 1)),
+    (datetime(2026, 10, 1), 3, datetime(2027, 1, 1)),
+    (datetime(2026, 10, 1), 27, datetime(2029, 1, 1)),
+    (datetime(2026, 1, 1), -1, datetime(2025, 12, 1)),
+    (datetime(2026, 10, 1), -12, datetime(2025, 10, 1)),
+    (datetime(2026, 3, 1), -15, datetime(2024, 12, 1)),
+])
+def test_add_months(month, months, expected):
+    assert add_months(month, months) == expected
+
+
+def test_month_start_drops_day_and_time():
+    assert month_start(datetime(2026, 10, 18, 23, 59, 59, 999999)) == datetime(2026, 10, 1)
+    assert month_start(datetime(2026, 10, 1)) == datetime(2026, 10, 1)
+
+
+def test_partition_name_pads_the_month():
+    assert partition_name(datetime(2026, 10, 1)) == "expense_reports_y2026m10"
+    assert partition_name(datetime(2027, 1, 1)) == "expense_reports_y2027m01"
+
+
+def test_bounds_are_parsed_from_the_partition_expression():
+    match = BOUND.search("FOR VALUES FROM ('2026-10-01 00:00:00') TO ('2026-11-01 00:00:00')")
+    assert (bound_value(match[1]), bound_value(match[2])) == (datetime(2026, 10, 1), datetime(2026, 11, 1))
+
+    match = BOUND.search("FOR VALUES FROM (MINVALUE) TO ('2025-10-01 00:00:00')")
+    assert (bound_value(match[1]), bound_value(match[2])) == (None, datetime(2025, 10, 1))
+
+    assert BOUND.search("DEFAULT") is None
+
+
+def test_literal_round_trips_through_bound_value():
+    month = datetime(2026, 10, 1)
+    assert literal(month) == "'2026-10-01 00:00:00'"
+    assert bound_value(literal(month)) == month
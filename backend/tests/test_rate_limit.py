@@ -0,0 +1,106 @@
+from fastapi import HTTPException
+from starlette.requests import Request
+from utils.rate_limit import limits
+from utils.rate_limit.backends import MemoryRateLimitBackend
+from utils.rate_limit.limits import RateLimit, RateLimiter, client_ip, username_key
+import asyncio
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.rate_limit.backends.time.monotonic", lambda: now[0])
+    return now
+
+
+def take(backend, key="login:ip:1.2.3.4", capacity=3, rate=1.0) -> float:
+    return asyncio.run(backend.take(key, capacity, rate))
+
+
+def test_bursts_up_to_capacity_then_refills_at_rate(clock):
+    backend = MemoryRateLimitBackend(maxsize=100)
+    assert [take(backend) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert take(backend) == pytest.approx(1.0)
+
+    clock[0] += 0.5
+    assert take(backend) == pytest.approx(0.5)  # Half a token back, a rejected take doesn't spend it
+    clock[0] += 0.5
+    assert take(backend) == 0.0
+    assert take(backend) == pytest.approx(1.0)
+
+
+def test_buckets_are_per_key(clock):
+    backend = MemoryRateLimitBackend(maxsize=100)
+    for _ in range(3):
+        take(backend, "a")
+    assert take(backend, "a") > 0
+    assert take(backend, "b") == 0.0
+
+
+def test_full_buckets_are_dropped(clock):
+    backend = MemoryRateLimitBackend(maxsize=100)
+    take(backend, "a")
+    take(backend, "b", capacity=10, rate=0.1)
+    clock[0] += 1  # a is full again, b isn't
+    take(backend, "c")
+    assert backend.stats()["buckets"] == 2
+    assert backend.stats()["evicted"] == 0
+
+
+def test_least_recently_used_bucket_is_evicted_past_maxsize(clock):
+    backend = MemoryRateLimitBackend(maxsize=2)
+    for key in ("a", "b", "c"):
+        take(backend, key)
+    assert backend.stats() == {"backend": "MemoryRateLimitBackend", "buckets": 2, "evicted": 1}
+    # a was evicted with a token taken, it starts over full
+    assert [take(backend, "a") for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_limiter_rejects_with_retry_after(clock):
+    limiter = RateLimiter(MemoryRateLimitBackend(maxsize=100), enabled=True)
+    limit = RateLimit("login:username", capacity=2, period=60)
+    asyncio.run(limiter.check(limit, "jdoe"))
+    asyncio.run(limiter.check(limit, "jdoe"))
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(limiter.check(limit, "jdoe"))
+    assert e.value.status_code == 429
+    assert e.value.headers == {"Retry-After": "30"}
+    assert limiter.stats()["allowed"] == {"login:username": 2}
+    assert limiter.stats()["rejected"] == {"login:username": 1}
+
+
+def test_disabled_limiter_allows_everything(clock):
+    limiter = RateLimiter(MemoryRateLimitBackend(maxsize=100), enabled=False)
+    for _ in range(10):
+        asyncio.run(limiter.check(RateLimit("signup:ip", 1, 600), "1.2.3.4"))
+
+
+def test_limits_from_env(monkeypatch):
+    monkeypatch.setenv("TEST_RATE_LIMIT", "5/60")
+    limit = RateLimit.from_env("test", "TEST_RATE_LIMIT", "1/1")
+    assert (limit.capacity, limit.period, limit.rate) == (5, 60.0, pytest.approx(5 / 60))
+    assert RateLimit.from_env("test", "UNSET_RATE_LIMIT", "30/60").capacity == 30
+
+
+def request(client: str, forwarded: str | None = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (client, 1234)})
+
+
+def test_client_ip_trusts_only_the_configured_proxies(monkeypatch):
+    assert client_ip(request("10.0.0.1", "6.6.6.6, 1.2.3.4")) == "10.0.0.1"
+
+    monkeypatch.setattr(limits, "AUTH_RATE_LIMIT_TRUSTED_PROXIES", 1)
+    # The client can prepend anything, only the address the proxy appended counts
+    assert client_ip(request("10.0.0.1", "6.6.6.6, 1.2.3.4")) == "1.2.3.4"
+    assert client_ip(request("10.0.0.1")) == "10.0.0.1"
+
+    monkeypatch.setattr(limits, "AUTH_RATE_LIMIT_TRUSTED_PROXIES", 2)
+    assert client_ip(request("10.0.0.1", "6.6.6.6, 1.2.3.4")) == "6.6.6.6"
+
+
+def test_username_keys_are_normalized_hashes():
+    assert username_key(" JDoe ") == username_key("jdoe")
+    assert username_key("jdoe") != username_key("jdoe2")
+    assert "jdoe" not in username_key("jdoe") and len(username_key("jdoe")) == 32
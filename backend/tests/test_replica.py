@@ -0,0 +1,126 @@
+from collections import deque
+from utils import create_access_token, ReadYourWritesMiddleware
+from utils.cache import MemoryCache, RecentWrites
+import database
+import asyncio
+import uuid
+import pytest
+
+NOW = 1_800_000_000.0
+
+
+@pytest.fixture
+def primary_positions(monkeypatch):
+    """The primary's WAL position at each check, the newest NOW."""
+    positions = deque([(NOW - 30, 100), (NOW - 20, 200), (NOW - 10, 300), (NOW, 400)])
+    monkeypatch.setattr(database, "_primary_positions", positions)
+    monkeypatch.setattr(database, "time", lambda: NOW + 0.5)
+    return positions
+
+
+def test_caught_up_replica_lags_by_the_time_since_the_last_check(primary_positions):
+    status = database.replica_lag(400, receiving=True)
+    assert status == {"available": True, "lag_seconds": 0.5, "replayed_until": NOW, "error": None}
+
+
+def test_lag_is_the_age_of_the_newest_primary_position_replayed(primary_positions, monkeypatch):
+    monkeypatch.setattr(database, "REPLICA_MAX_LAG", 15)
+    status = database.replica_lag(350, receiving=True)
+    assert status["replayed_until"] == NOW - 10
+    assert status["lag_seconds"] == 10.5
+    assert status["available"]
+
+    assert not database.replica_lag(250, receiving=True)["available"]  # 20.5 s behind
+
+
+def test_replica_behind_every_recorded_position_is_unavailable(primary_positions):
+    status = database.replica_lag(50, receiving=True)
+    assert status == {"available": False, "lag_seconds": None, "replayed_until": None, "error": None}
+
+
+def test_replica_without_wal_receiver_is_unavailable(primary_positions):
+    status = database.replica_lag(400, receiving=False)
+    assert not status["available"]
+    assert status["error"] == "WAL receiver isn't running."
+
+
+def test_primary_is_not_a_replica(primary_positions):
+    assert database.replica_lag(None, receiving=False)["error"] == "Not a standby."
+
+
+def test_replica_has_replayed_writes_up_to_its_position(monkeypatch):
+    monkeypatch.setitem(database._replica_status, "replayed_until", NOW - 10)
+    assert database.replica_has_replayed(NOW - 11)
+    assert database.replica_has_replayed(NOW - 10)
+    assert not database.replica_has_replayed(NOW - 9)
+
+    monkeypatch.setitem(database._replica_status, "replayed_until", None)
+    assert not database.replica_has_replayed(NOW - 3600)
+
+
+class ReadYourWrites:
+    """ReadYourWritesMiddleware around an app recording request.state.read_primary and answering status."""
+
+    def __init__(self, status: int = 200):
+        self.status = status
+        self.read_primary = []
+        self.middleware = ReadYourWritesMiddleware(self.app)
+
+    async def app(self, scope, receive, send):
+        self.read_primary.append(scope.get("state", {}).get("read_primary", False))
+        await send({"type": "http.response.start", "status": self.status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    def request(self, method: str, token: str | None) -> bool:
+        headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+        scope = {"type": "http", "method": method, "path": "/reports", "headers": headers}
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            pass
+
+        asyncio.run(self.middleware(scope, receive, send))
+        return self.read_primary[-1]
+
+
+@pytest.fixture
+def recent_writes(monkeypatch):
+    writes = RecentWrites(MemoryCache(100), ttl=10)
+    monkeypatch.setattr("utils.read_your_writes.recent_writes", writes)
+    monkeypatch.setattr("utils.read_your_writes.get_replica_url", lambda: "postgresql+psycopg2://replica/expenses")
+    return writes
+
+
+def token() -> str:
+    return create_access_token(data={"sub": "jdoe", "id": str(uuid.uuid4()), "role": "user"})
+
+
+def test_reads_after_a_write_go_to_the_primary_until_the_replica_has_it(recent_writes, monkeypatch):
+    app, user, other = ReadYourWrites(), token(), token()
+    monkeypatch.setitem(database._replica_status, "replayed_until", 0.0)
+    assert not app.request("GET", user)
+
+    app.request("PUT", user)
+    assert app.request("GET", user)
+    assert not app.request("GET", other)
+
+    monkeypatch.setitem(database._replica_status, "replayed_until", float("inf"))
+    assert not app.request("GET", user)
+
+
+def test_failed_writes_and_anonymous_requests_are_not_recorded(recent_writes, monkeypatch):
+    monkeypatch.setitem(database._replica_status, "replayed_until", 0.0)
+    user = token()
+    ReadYourWrites(status=400).request("POST", user)
+    ReadYourWrites().request("POST", None)
+    ReadYourWrites().request("POST", "not a token")
+    assert recent_writes.backend.stats()["size"] == 0
+    assert not ReadYourWrites().request("GET", user)
+
+
+def test_nothing_is_recorded_without_a_replica(recent_writes, monkeypatch):
+    monkeypatch.setattr("utils.read_your_writes.get_replica_url", lambda: None)
+    ReadYourWrites().request("POST", token())
+    assert recent_writes.backend.stats()["size"] == 0
@@ -0,0 +1,41 @@
+from models.rollup_models import ExpenseReportRollup
+from schema import ExpenseStatus
+from sqlalchemy.dialects import postgresql
+from datetime import date, datetime
+import uuid
+
+
+def rows(stmt) -> list[tuple]:
+    params = stmt.compile(dialect=postgresql.dialect()).params
+    count = sum(1 for key in params if key.startswith("month_m"))
+    return sorted(
+        (params[f"month_m{i}"], params[f"user_id_m{i}"], params[f"status_m{i}"].value,
+         params[f"total_amount_m{i}"], params[f"report_count_m{i}"])
+        for i in range(count)
+    )
+
+
+def test_deltas_merge_changes_to_the_same_group():
+    user, other = str(uuid.uuid4()), str(uuid.uuid4())
+    stmt = ExpenseReportRollup.deltas([
+        (user, datetime(2026, 10, 1), "Pending", 10.0, 1),
+        (user, datetime(2026, 10, 31, 23, 59), ExpenseStatus.PENDING.value, 5.5, 1),
+        (user, datetime(2026, 10, 2), "Pending", -10.0, -1),  # Moved out of Pending
+        (user, datetime(2026, 10, 2), "Approved", 10.0, 1),
+        (user, datetime(2026, 11, 1), "Pending", 2.0, 1),
+        (other, datetime(2026, 10, 5), "Pending", 1.0, 1),
+    ])
+    assert rows(stmt) == sorted([
+        (date(2026, 10, 1), user, "Pending", 5.5, 1),
+        (date(2026, 10, 1), user, "Approved", 10.0, 1),
+        (date(2026, 11, 1), user, "Pending", 2.0, 1),
+        (date(2026, 10, 1), other, "Pending", 1.0, 1),
+    ])
+
+
+def test_deltas_add_to_existing_totals_on_conflict():
+    sql = str(ExpenseReportRollup.deltas([(str(uuid.uuid4()), datetime(2026, 10, 1), "Pending", 1.0, 1)])
+              .compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (month, user_id, status) DO UPDATE" in sql
+    assert "total_amount = (expense_report_rollups.total_amount + excluded.total_amount)" in sql
+    assert "report_count = (expense_report_rollups.report_count + excluded.report_count)" in sql
@@ -0,0 +1,46 @@
+from schema import (
+    ExpenseRetrieve,
+    ExpenseStatus,
+    UserRetrieve,
+    UserRole,
+    expense_list_adapter,
+    expense_row_list_adapter,
+    user_list_adapter,
+    user_row_list_adapter,
+)
+from datetime import datetime
+import uuid
+import warnings
+
+USER_ID = uuid.uuid4()
+
+
+def expense_row(**values) -> dict:
+    # As ExpenseReport.retrieve_columns selects them: user_id and status as text
+    row = {"title": "Taxi", "amount": 12.5, "description": None, "file": None, "id": 7, "user_id": str(USER_ID),
+           "date": datetime(2026, 10, 18, 9, 30, 0, 120000), "status": "Approved", "admin_comment": "ok"}
+    return {**row, **values}
+
+
+def test_expense_rows_serialize_like_validated_reports():
+    rows = [expense_row(), expense_row(id=8, date=datetime(2026, 1, 1), amount=80.0, status="Pending", admin_comment=None)]
+    validated = expense_list_adapter.validate_python(rows)
+    assert validated[0].status is ExpenseStatus.APPROVED
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert expense_row_list_adapter.dump_json(rows) == expense_list_adapter.dump_json(validated)
+
+
+def test_row_adapters_keep_the_models_fields_in_order():
+    assert list(expense_row_list_adapter.json_schema()["$defs"]["ExpenseRetrieveRow"]["properties"]) == list(ExpenseRetrieve.model_fields)
+    assert list(user_row_list_adapter.json_schema()["$defs"]["UserRetrieveRow"]["properties"]) == list(UserRetrieve.model_fields)
+
+
+def test_user_rows_serialize_like_validated_users():
+    rows = [{"id": str(USER_ID), "first_name": None, "last_name": "Doe", "username": "jdoe", "email": "jdoe@example.com",
+             "google_id": None, "avatar": None, "role": "admin"}]
+    validated = user_list_adapter.validate_python(rows)
+    assert validated[0].role is UserRole.ADMIN
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert user_row_list_adapter.dump_json(rows) == user_list_adapter.dump_json(validated)
@@ -0,0 +1,88 @@
+from fastapi import HTTPException
+from utils import create_access_token, get_current_user
+from utils.auth.token_cache import VerifiedTokenCache
+from schema import CurrentUser
+import sys
+import uuid
+import pytest
+
+# utils.auth re-exports the token_cache instance under the module's name
+token_cache_module = sys.modules["utils.auth.token_cache"]
+
+
+def current_user(user_id: str | None = None) -> CurrentUser:
+    return CurrentUser(id=user_id or str(uuid.uuid4()), username="jdoe", role="user")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_800_000_000.0]
+    monkeypatch.setattr(token_cache_module.time, "time", lambda: now[0])
+    return now
+
+
+def test_entries_expire_and_are_evicted_least_recently_used(clock):
+    cache = VerifiedTokenCache(maxsize=2, token_lifetime=1800)
+    a, b, c = current_user(), current_user(), current_user()
+    cache.put("a", a, clock[0] + 10)
+    cache.put("b", b, clock[0] + 100)
+    assert cache.get("a") == a  # a is now the most recently used
+    cache.put("c", c, clock[0] + 100)
+    assert cache.get("b") is None
+    assert cache.get("a") == a and cache.get("c") == c
+
+    clock[0] += 10
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 1
+
+
+def test_invalidated_users_tokens_issued_before_are_revoked(clock):
+    cache = VerifiedTokenCache(maxsize=10, token_lifetime=1800)
+    user = current_user()
+    cache.put("token", user, clock[0] + 1800)
+    cache.put("other", current_user(), clock[0] + 1800)
+
+    cache.invalidate_user(user.id)
+    assert cache.get("token") is None
+    assert cache.get("other") is not None
+    assert cache.is_revoked(user.id, clock[0] - 1)
+    # iat has a one second resolution, a token of the same second is the one the client refreshed to
+    assert not cache.is_revoked(user.id, int(clock[0]))
+    assert not cache.is_revoked(str(uuid.uuid4()), clock[0] - 1)
+
+
+def test_revocations_are_forgotten_once_older_tokens_expired(clock):
+    cache = VerifiedTokenCache(maxsize=10, token_lifetime=1800)
+    first, second = str(uuid.uuid4()), str(uuid.uuid4())
+    cache.invalidate_user(first)
+    clock[0] += 1000
+    cache.invalidate_user(second)
+    assert cache.stats()["revoked_users"] == 2
+
+    clock[0] += 800
+    cache.invalidate_user(second)  # Invalidated again, it moves to the end
+    assert cache.stats()["revoked_users"] == 1
+    assert not cache.is_revoked(first, clock[0] - 1801)
+    assert cache.is_revoked(second, clock[0] - 1)
+
+
+def test_get_current_user_refuses_tokens_issued_before_a_role_change(monkeypatch, clock):
+    cache = VerifiedTokenCache(maxsize=10, token_lifetime=1800)
+    monkeypatch.setattr("utils.auth.auth_utils.token_cache", cache)
+    user_id = str(uuid.uuid4())
+    token = create_access_token(data={"sub": "jdoe", "id": user_id, "role": "user"})
+    assert get_current_user(token).id == uuid.UUID(user_id)
+
+    # A change well after the token was issued (the clock is ahead of the token's iat)
+    cache.invalidate_user(user_id)
+    with pytest.raises(HTTPException) as e:
+        get_current_user(token)
+    assert e.value.status_code == 401
+
+
+def test_get_current_user_refuses_invalid_tokens():
+    with pytest.raises(HTTPException):
+        get_current_user("not a token")
+    token = create_access_token(data={"sub": "jdoe", "id": str(uuid.uuid4())})  # No role claim
+    with pytest.raises(HTTPException):
+        get_current_user(token)
@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+from main import create_app
+from services.files_service.limits import MAX_MULTIPART_BODY_SIZE, sniff_content_type
+import pytest
+
+ORIGIN = "http://localhost:5173"
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Not entered as a context manager: the lifespan, and so the database, isn't started
+    return TestClient(create_app())
+
+
+def test_oversized_upload_is_refused_from_its_content_length_with_cors_headers(client):
+    response = client.post(
+        "/reports/",
+        content=b"--x--\r\n",
+        headers={
+            "Origin": ORIGIN,
+            "Content-Type": "multipart/form-data; boundary=x",
+            "Content-Length": str(MAX_MULTIPART_BODY_SIZE + 1),
+        },
+    )
+    assert response.status_code == 413
+    assert response.json() == {"detail": "File is too large."}
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+
+
+def test_other_requests_pass_through(client):
+    response = client.get("/", headers={"Origin": ORIGIN})
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+
+
+@pytest.mark.parametrize("head, content_type", [
+    (b"\xff\xd8\xff\xe0", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"%PDF-1.7", "application/pdf"),
+    (b"RIFF\x00\x00\x00\x00WEBP", "image/webp"),
+    (b"\x00\x00\x00\x18ftypheic", "image/heic"),
+    (b"hello, world", None),
+])
+def test_sniff_content_type(head, content_type):
+    assert sniff_content_type(head) == content_type
@@ -1,3 +1,9 @@
-from .auth import hash_password, verify_password, create_access_token, create_refresh_token, get_current_user, decode_refresh_token, oauth
+from .auth import hash_password, verify_password, create_access_token, create_refresh_token, get_current_user, get_stream_user, decode_refresh_token, get_oauth, hash_password_in_pool, verify_password_in_pool, shutdown_password_pool, token_cache, invalidate_user_tokens
 from .admin import verify_admin
-from .deps import current_user_dep, db_dep
+from .deps import current_user_dep, stream_user_dep, db_dep, read_db_dep, async_db_dep
+from .pagination import encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor, MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE
+from .cache import user_cache, recent_writes
+from .rate_limit import rate_limiter, limit_login, limit_signup, limit_refresh
+from .responses import AdapterJSONResponse
+from .etag import make_etag, etag_matches, etag_headers
+from .read_your_writes import ReadYourWritesMiddleware
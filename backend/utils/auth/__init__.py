@@ -1 +1,3 @@
-from .auth_utils import hash_password, verify_password, create_access_token, create_refresh_token, get_current_user, decode_refresh_token, oauth
+from .auth_utils import hash_password, verify_password, create_access_token, create_refresh_token, get_current_user, get_stream_user, decode_refresh_token, get_oauth
+from .password_pool import hash_password_in_pool, verify_password_in_pool, shutdown_password_pool
+from .token_cache import token_cache, invalidate_user_tokens
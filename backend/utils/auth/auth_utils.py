@@ -1,45 +1,47 @@
 from typing import Annotated
-from passlib.context import CryptContext
-from fastapi import Depends
+from fastapi import Depends, Query
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 import os
 from schema import CurrentUser
 from exceptions import invalid_token_exception
-from authlib.integrations.starlette_client import OAuth
+from password_hashing import hash_password, verify_password  # noqa: F401, re-exported
+from .token_cache import token_cache, ACCESS_TOKEN_EXPIRE_MINUTES
 
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", 7))
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/login")
+oauth2_bearer_optional = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
-oauth = OAuth()
-oauth.register(
-    name="google",
-    server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
-    client_id=os.environ.get("GOOGLE_CLIENT_ID"),
-    client_secret=os.environ.get("GOOGLE_CLIENT_SECRET"),
-    authorize_state=os.environ.get("JWT_SECRET_KEY"),
-    client_kwargs={"scope": "openid profile email"},
-)
+oauth = None
 
 
-def hash_password(password: str) -> str:
-    return bcrypt_context.hash(password)
+def get_oauth():
+    """The authlib OAuth registry with the Google client, registered on first use by the Google login routes."""
+    global oauth
+    if oauth is None:
+        from authlib.integrations.starlette_client import OAuth
 
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt_context.verify(plain_password, hashed_password)
+        oauth = OAuth()
+        oauth.register(
+            name="google",
+            server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
+            client_id=os.environ.get("GOOGLE_CLIENT_ID"),
+            client_secret=os.environ.get("GOOGLE_CLIENT_SECRET"),
+            authorize_state=os.environ.get("JWT_SECRET_KEY"),
+            client_kwargs={"scope": "openid profile email"},
+        )
+    return oauth
 
 
 def create_access_token(data: dict) -> str:
-    expires = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    issued_at = datetime.now(timezone.utc)
+    expires = issued_at + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = data.copy()
-    to_encode.update({"exp": expires})
+    to_encode.update({"exp": expires, "iat": issued_at})
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
@@ -51,19 +53,40 @@ def create_refresh_token(data: dict) -> str:
 
 
 def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]) -> CurrentUser:
+    # Tokens come back many times during their lifetime, skip decoding and validating them again.
+    current_user = token_cache.get(token)
+    if current_user is not None:
+        return current_user
+
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        if not {"sub", "id", "role"}.issubset(payload.keys()):
+        if not {"sub", "id", "role", "exp"}.issubset(payload.keys()):
             raise invalid_token_exception
 
         username, user_id, user_role = payload.get("sub"), payload.get("id"), payload.get("role")
+        if token_cache.is_revoked(user_id, payload.get("iat", 0)):
+            raise invalid_token_exception
 
         current_user = CurrentUser(id=user_id, username=username, role=user_role)
+        token_cache.put(token, current_user, payload["exp"])
         return current_user
     except JWTError:
         raise invalid_token_exception
 
 
+def get_stream_user(
+        bearer_token: Annotated[str | None, Depends(oauth2_bearer_optional)],
+        access_token: Annotated[str | None, Query()] = None,
+) -> CurrentUser:
+    """get_current_user for the server-sent event streams. The browser's EventSource can't send an Authorization header,
+    so the access token may be passed as the access_token query parameter instead. The token is then part of the URL,
+    proxies shouldn't log query strings of these requests."""
+    token = bearer_token or access_token
+    if token is None:
+        raise invalid_token_exception
+    return get_current_user(token)
+
+
 def decode_refresh_token(token: str) -> str:
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
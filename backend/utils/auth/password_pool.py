@@ -0,0 +1,55 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, TypeVar
+from password_hashing import hash_password, verify_and_update_password
+from exceptions import password_pool_busy_exception
+import multiprocessing
+import asyncio
+import os
+
+# bcrypt takes ~250 ms of CPU per call, so it runs in its own processes instead of the event loop or Starlette's threadpool,
+# and a login burst can only use PASSWORD_HASH_WORKERS cores.
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Hashing requests running or waiting in this process, beyond that requests are refused with 429 instead of piling up.
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 8))
+
+T = TypeVar("T")
+
+password_pool: ProcessPoolExecutor | None = None
+pending = 0
+
+
+def get_password_pool() -> ProcessPoolExecutor:
+    global password_pool
+    if password_pool is None:
+        # spawn rather than fork, forking a process that runs an event loop and threads isn't safe
+        password_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return password_pool
+
+
+def shutdown_password_pool() -> None:
+    global password_pool
+    if password_pool is not None:
+        password_pool.shutdown(cancel_futures=True)
+        password_pool = None
+
+
+async def run_in_password_pool(func: Callable[..., T], *args) -> T:
+    global pending
+    if pending >= PASSWORD_HASH_MAX_PENDING:
+        raise password_pool_busy_exception
+
+    # Only touched from the event loop thread, so no lock is needed
+    pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_password_pool(), func, *args)
+    finally:
+        pending -= 1
+
+
+async def hash_password_in_pool(password: str) -> str:
+    return await run_in_password_pool(hash_password, password)
+
+
+async def verify_password_in_pool(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Returns whether the password matches, and a new hash to store if the current one has a different cost."""
+    return await run_in_password_pool(verify_and_update_password, plain_password, hashed_password)
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from schema import CurrentUser
+import threading
+import hashlib
+import time
+import os
+
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+
+
+class VerifiedTokenCache:
+    """LRU cache of access tokens that already passed jwt.decode, keyed by their SHA-256 digest and dropped at their exp.
+
+    Also remembers users whose role changed: their tokens issued before the change are refused from then on, so the
+    client has to refresh and gets a token with the new role. A change is remembered for token_lifetime seconds, by
+    then the tokens issued before it have expired anyway.
+
+    Both are per process. The revocation only applies in the app worker that made the role change: the other workers
+    keep accepting the user's older tokens, with their old role, until those expire (ACCESS_TOKEN_EXPIRE_MINUTES).
+    Checking a shared store instead would cost a round trip on every request, which this cache is there to avoid."""
+
+    def __init__(self, maxsize: int, token_lifetime: float):
+        self.maxsize = maxsize
+        self.token_lifetime = token_lifetime
+        self._entries: OrderedDict[bytes, tuple[CurrentUser, float]] = OrderedDict()
+        # user id -> not before, oldest first
+        self._not_before: OrderedDict[str, float] = OrderedDict()
+        # get_current_user is a sync dependency, it runs on several threadpool threads at once
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> CurrentUser | None:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            current_user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return current_user
+
+    def put(self, token: str, current_user: CurrentUser, expires_at: float) -> None:
+        with self._lock:
+            self._entries[self._key(token)] = (current_user, expires_at)
+            self._entries.move_to_end(self._key(token))
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, user_id: str, issued_at: float) -> bool:
+        not_before = self._not_before.get(str(user_id))
+        return not_before is not None and issued_at < not_before
+
+    def invalidate_user(self, user_id: str) -> None:
+        user_id = str(user_id)
+        now = time.time()
+        with self._lock:
+            # JWT iat has a one second resolution, tokens issued in the same second as the change are still accepted
+            self._not_before.pop(user_id, None)
+            self._not_before[user_id] = int(now)
+            while next(iter(self._not_before.values())) <= now - self.token_lifetime:
+                self._not_before.popitem(last=False)
+            for key in [key for key, (current_user, _) in self._entries.items() if str(current_user.id) == user_id]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "revoked_users": len(self._not_before)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._not_before.clear()
+
+
+token_cache = VerifiedTokenCache(TOKEN_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def invalidate_user_tokens(user_id: str) -> None:
+    """Call after changing a user's role, the role claim of their current access tokens is stale. Only this process
+    refuses them from then on, see VerifiedTokenCache."""
+    token_cache.invalidate_user(user_id)
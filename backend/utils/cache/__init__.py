@@ -0,0 +1,3 @@
+from .backends import CacheBackend, MemoryCache, RedisCache
+from .user_cache import UserCache, user_cache
+from .recent_writes import RecentWrites, recent_writes
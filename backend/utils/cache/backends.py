@@ -0,0 +1,90 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable
+import time
+
+
+class CacheBackend(ABC):
+    """Key/value store with per-entry TTL. Async so a shared backend doesn't block the event loop."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Any | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "hits": self.hits, "misses": self.misses}
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache, each app worker has its own."""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "size": len(self._entries)}
+
+
+class RedisCache(CacheBackend):
+    """Cache shared by all app workers, so an invalidation in one worker is seen by the others.
+    Needs the redis package (pip install redis), which is only imported when this backend is used."""
+
+    def __init__(self, url: str, dumps: Callable[[Any], str], loads: Callable[[str], Any], prefix: str = ""):
+        import redis.asyncio
+
+        super().__init__()
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.dumps = dumps
+        self.loads = loads
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Any | None:
+        value = await self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.client.set(self.prefix + key, self.dumps(value), px=int(ttl * 1000))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
@@ -0,0 +1,35 @@
+from uuid import UUID
+from database import REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL
+from .backends import CacheBackend, MemoryCache, RedisCache
+import os
+
+RECENT_WRITES_SIZE = int(os.environ.get("RECENT_WRITES_SIZE", 100000))
+# e.g. redis://localhost:6379/0, needed with several app workers: a user's read may be served by another worker than their write
+RECENT_WRITES_URL = os.environ.get("RECENT_WRITES_URL")
+
+
+class RecentWrites:
+    """When each user last wrote something, as a time.time(), for utils.ReadYourWritesMiddleware. Kept for as long as an
+    available replica may lag behind the write, after that the replica has it anyway."""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def get(self, user_id: UUID | str) -> float | None:
+        return await self.backend.get(f"write:{user_id}")
+
+    async def record(self, user_id: UUID | str, written_at: float) -> None:
+        await self.backend.set(f"write:{user_id}", written_at, self.ttl)
+
+
+def create_recent_writes() -> RecentWrites:
+    if RECENT_WRITES_URL:
+        backend = RedisCache(RECENT_WRITES_URL, dumps=repr, loads=float, prefix="expense-reports:")
+    else:
+        backend = MemoryCache(RECENT_WRITES_SIZE)
+    # The replica's lag is up to REPLICA_CHECK_INTERVAL seconds old
+    return RecentWrites(backend, REPLICA_MAX_LAG + REPLICA_CHECK_INTERVAL)
+
+
+recent_writes = create_recent_writes()
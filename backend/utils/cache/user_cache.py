@@ -0,0 +1,46 @@
+from uuid import UUID
+from schema import UserRetrieve
+from .backends import CacheBackend, MemoryCache, RedisCache
+import os
+
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 60))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+# e.g. redis://localhost:6379/0 to share the cache between workers, in-process cache otherwise
+USER_CACHE_URL = os.environ.get("USER_CACHE_URL")
+
+
+class UserCache:
+    """Read-through cache of UserRetrieve by id and by google_id, for User.get_user and User.get_user_by_google_id.
+    The User methods that change a user invalidate it, the TTL bounds staleness from changes made elsewhere."""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def get_by_id(self, user_id: UUID | str) -> UserRetrieve | None:
+        return await self.backend.get(f"user:id:{user_id}")
+
+    async def get_by_google_id(self, google_id: str) -> UserRetrieve | None:
+        return await self.backend.get(f"user:google:{google_id}")
+
+    async def set(self, user: UserRetrieve) -> None:
+        await self.backend.set(f"user:id:{user.id}", user, self.ttl)
+        if user.google_id:
+            await self.backend.set(f"user:google:{user.google_id}", user, self.ttl)
+
+    async def invalidate(self, user_id: UUID | str, google_id: str | None = None) -> None:
+        keys = [f"user:id:{user_id}"]
+        if google_id:
+            keys.append(f"user:google:{google_id}")
+        await self.backend.delete(*keys)
+
+
+def create_user_cache() -> UserCache:
+    if USER_CACHE_URL:
+        backend = RedisCache(USER_CACHE_URL, dumps=UserRetrieve.model_dump_json, loads=UserRetrieve.model_validate_json, prefix="expense-reports:")
+    else:
+        backend = MemoryCache(USER_CACHE_SIZE)
+    return UserCache(backend, USER_CACHE_TTL)
+
+
+user_cache = create_user_cache()
@@ -1,9 +1,13 @@
 from fastapi import Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
-from .auth import get_current_user
+from .auth import get_current_user, get_stream_user
 from schema import CurrentUser
-from database import get_db
+from database import get_db, get_read_db, get_async_db
 
 current_user_dep = Annotated[CurrentUser, Depends(get_current_user)]
+stream_user_dep = Annotated[CurrentUser, Depends(get_stream_user)]  # For server-sent event streams, see get_stream_user
 db_dep = Annotated[Session, Depends(get_db)]
+read_db_dep = Annotated[Session, Depends(get_read_db)]  # For routes that only read, they may read from the replica
+async_db_dep = Annotated[AsyncSession, Depends(get_async_db)]  # For async def routes
@@ -0,0 +1,22 @@
+import hashlib
+
+
+def make_etag(scope: str, *versions: int) -> str:
+    """Strong ETag of a listing at a given ListVersion. The scope is hashed in so that two users' listings at the
+    same version (e.g. after logging in as someone else in the same browser) never share an ETag. Listings built
+    from several scopes pass the version of each."""
+    return '"' + hashlib.sha256(f"{scope}:{':'.join(map(str, versions))}".encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check, which uses the weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    # no-cache: the browser may keep the body but has to revalidate it with If-None-Match on every use
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
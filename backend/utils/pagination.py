@@ -0,0 +1,37 @@
+from datetime import datetime
+from exceptions import invalid_cursor_exception
+import base64
+import os
+
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 100))
+DEFAULT_PAGE_SIZE = min(int(os.environ.get("DEFAULT_PAGE_SIZE", 50)), MAX_PAGE_SIZE)
+
+
+def encode_cursor(date: datetime, row_id: int) -> str:
+    """Encode the (date, id) keyset position of the last row of a page into an opaque token."""
+    raw = f"{date.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(date), int(row_id)
+    except ValueError:
+        raise invalid_cursor_exception
+
+
+def encode_search_cursor(rank: float, row_id: int) -> str:
+    """Encode the (rank, id) keyset position of the last row of a search results page into an opaque token."""
+    raw = f"{rank!r}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        rank, row_id = raw.rsplit("|", 1)
+        return float(rank), int(row_id)
+    except ValueError:
+        raise invalid_cursor_exception
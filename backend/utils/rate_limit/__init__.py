@@ -0,0 +1,2 @@
+from .backends import RateLimitBackend, MemoryRateLimitBackend, RedisRateLimitBackend
+from .limits import RateLimit, rate_limiter, limit_login, limit_signup, limit_refresh
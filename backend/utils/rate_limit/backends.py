@@ -0,0 +1,106 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import time
+
+# Token bucket of KEYS[1] as a hash (tokens, updated_at), on Redis' clock so every app worker agrees on the time.
+# Floats are returned as strings, Redis truncates Lua numbers to integers.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = capacity
+if bucket[1] then
+    tokens = math.min(capacity, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+end
+if tokens < 1 then
+    return tostring((1 - tokens) / rate)
+end
+tokens = tokens - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000))
+return '0'
+"""
+
+
+class RateLimitBackend(ABC):
+    """Token buckets by key: a bucket holds up to capacity tokens and regains rate tokens per second, each request
+    takes one. Async so a shared backend doesn't block the event loop."""
+
+    @abstractmethod
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        """Takes a token from key's bucket and returns 0, or when it is empty takes nothing and returns the seconds
+        until it has a token again."""
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets of this process, each app worker has its own and so allows the full rate.
+
+    The buckets are kept in the order they were last taken from. A bucket left alone until it refilled is the same as
+    a missing one: every take first drops the least recently used buckets that are full again, each bucket is dropped
+    once, so a take is O(1) amortized. Past maxsize buckets the least recently used one is dropped even if it isn't
+    full, a flood of distinct IPs or usernames can't grow the store any further."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # key -> (tokens, updated_at, full_at). Only touched from the event loop, no lock is needed.
+        self._buckets: OrderedDict[str, tuple[float, float, float]] = OrderedDict()
+        self.evicted = 0  # Dropped for maxsize, before they were full
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        now = time.monotonic()
+        self._evict_full(now)
+
+        bucket = self._buckets.get(key)
+        tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+
+        tokens -= 1
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+        return 0.0
+
+    def _evict_full(self, now: float) -> None:
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now:
+                return
+            del self._buckets[key]
+
+    def stats(self) -> dict:
+        return {**super().stats(), "buckets": len(self._buckets), "evicted": self.evicted}
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by all app workers, so the limits apply to the whole deployment rather than per worker.
+    Needs the redis package (pip install redis), which is only imported when this backend is used.
+
+    Fails open: while Redis can't be reached requests aren't limited, logins shouldn't go down with it."""
+
+    def __init__(self, url: str, prefix: str = ""):
+        import redis.asyncio
+
+        self.errors = (redis.RedisError, OSError)
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.script = self.client.register_script(TAKE_SCRIPT)
+        self.prefix = prefix
+        self.failures = 0
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        try:
+            return float(await self.script(keys=[self.prefix + key], args=[capacity, rate]))
+        except self.errors as e:
+            self.failures += 1
+            print("Rate limit backend failed:", repr(e))
+            return 0.0
+
+    def stats(self) -> dict:
+        return {**super().stats(), "failures": self.failures}
@@ -0,0 +1,108 @@
+from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
+from dataclasses import dataclass
+from collections import Counter
+from typing import Annotated
+from math import ceil
+from exceptions import rate_limited_exception
+from .backends import RateLimitBackend, MemoryRateLimitBackend, RedisRateLimitBackend
+import hashlib
+import os
+
+AUTH_RATE_LIMIT_ENABLED = os.environ.get("AUTH_RATE_LIMIT_ENABLED", "true").lower() == "true"
+# e.g. redis://localhost:6379/0 to share the buckets between workers, in-process buckets otherwise
+AUTH_RATE_LIMIT_URL = os.environ.get("AUTH_RATE_LIMIT_URL")
+AUTH_RATE_LIMIT_MAX_KEYS = int(os.environ.get("AUTH_RATE_LIMIT_MAX_KEYS", 100000))
+# Reverse proxies in front of the app, each appends the address it got the request from to X-Forwarded-For. 0 takes
+# the connection's address, don't set it higher than the actual proxies or clients can pick their own IP.
+AUTH_RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("AUTH_RATE_LIMIT_TRUSTED_PROXIES", 0))
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Bursts of up to capacity requests, refilled evenly over period seconds."""
+    name: str
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def from_env(cls, name: str, variable: str, default: str) -> "RateLimit":
+        """From a "<requests>/<seconds>" setting, e.g. "5/60" for 5 requests a minute."""
+        capacity, period = os.environ.get(variable, default).split("/")
+        return cls(name, int(capacity), float(period))
+
+
+# Per IP limits are loose enough for an office behind a single address, the per username one stops password
+# guessing on an account from many addresses.
+LOGIN_PER_IP = RateLimit.from_env("login:ip", "LOGIN_RATE_LIMIT_PER_IP", "30/60")
+LOGIN_PER_USERNAME = RateLimit.from_env("login:username", "LOGIN_RATE_LIMIT_PER_USERNAME", "5/60")
+SIGNUP_PER_IP = RateLimit.from_env("signup:ip", "SIGNUP_RATE_LIMIT_PER_IP", "5/600")
+REFRESH_PER_IP = RateLimit.from_env("refresh:ip", "REFRESH_RATE_LIMIT_PER_IP", "60/60")
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend, enabled: bool):
+        self.backend = backend
+        self.enabled = enabled
+        self.allowed = Counter()
+        self.rejected = Counter()
+
+    async def check(self, limit: RateLimit, key: str) -> None:
+        """Takes a request from key's bucket of limit, raises rate_limited_exception with the time until the next one is
+        allowed in Retry-After when it is empty."""
+        if not self.enabled:
+            return
+
+        retry_after = await self.backend.take(f"{limit.name}:{key}", limit.capacity, limit.rate)
+        if retry_after > 0:
+            self.rejected[limit.name] += 1
+            raise rate_limited_exception(ceil(retry_after))
+        self.allowed[limit.name] += 1
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "allowed": dict(self.allowed), "rejected": dict(self.rejected), **self.backend.stats()}
+
+
+def create_rate_limiter() -> RateLimiter:
+    if AUTH_RATE_LIMIT_URL:
+        backend = RedisRateLimitBackend(AUTH_RATE_LIMIT_URL, prefix="expense-reports:rate-limit:")
+    else:
+        backend = MemoryRateLimitBackend(AUTH_RATE_LIMIT_MAX_KEYS)
+    return RateLimiter(backend, AUTH_RATE_LIMIT_ENABLED)
+
+
+rate_limiter = create_rate_limiter()
+
+
+def client_ip(request: Request) -> str:
+    if AUTH_RATE_LIMIT_TRUSTED_PROXIES > 0:
+        forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",") if address.strip()]
+        if len(forwarded) >= AUTH_RATE_LIMIT_TRUSTED_PROXIES:
+            return forwarded[-AUTH_RATE_LIMIT_TRUSTED_PROXIES]
+    return request.client.host if request.client else "unknown"
+
+
+def username_key(username: str) -> str:
+    # Hashed, so the shared backend doesn't hold usernames (or passwords typed in the username field)
+    return hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+
+
+# Route dependencies (dependencies=[Depends(...)]), FastAPI resolves them before the route's own parameters, so a
+# rejected request gets no database connection and no password hashing.
+
+async def limit_login(request: Request, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> None:
+    """The form is the route's own, FastAPI parses it once for both."""
+    await rate_limiter.check(LOGIN_PER_IP, client_ip(request))
+    await rate_limiter.check(LOGIN_PER_USERNAME, username_key(form_data.username))
+
+
+async def limit_signup(request: Request) -> None:
+    await rate_limiter.check(SIGNUP_PER_IP, client_ip(request))
+
+
+async def limit_refresh(request: Request) -> None:
+    await rate_limiter.check(REFRESH_PER_IP, client_ip(request))
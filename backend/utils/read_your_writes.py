@@ -0,0 +1,60 @@
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from schema import CurrentUser
+from database import get_replica_url, replica_has_replayed
+from .auth import get_current_user
+from .cache import recent_writes
+import time
+
+
+def bearer_user(scope: Scope) -> CurrentUser | None:
+    """The user of the request's access token, None without a valid one (the route itself then answers 401 if needed)."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                return get_current_user(token)
+            except HTTPException:
+                return None
+    return None
+
+
+class ReadYourWritesMiddleware:
+    """Sends a user's reads to the primary until the replica has their last write, so they see their change even when
+    the replica lags. The successful writes (any method but GET, HEAD and OPTIONS) of authenticated users are recorded in
+    recent_writes. A later read of the same user that the replica can't have yet gets request.state.read_primary, which
+    get_read_db follows.
+
+    Keyed on the user of the access token rather than on something the client sends back: the frontend calls the API
+    cross-origin without credentials, so it never returns cookies. Does nothing without a replica."""
+    SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or get_replica_url() is None:
+            await self.app(scope, receive, send)
+            return
+
+        user = bearer_user(scope)
+        if user is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] in self.SAFE_METHODS:
+            written_at = await recent_writes.get(user.id)
+            if written_at is not None and not replica_has_replayed(written_at):
+                scope.setdefault("state", {})["read_primary"] = True
+            await self.app(scope, receive, send)
+            return
+
+        async def send_recording_write(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                # The route has committed by now, its write is older than this
+                await recent_writes.record(user.id, time.time())
+            await send(message)
+
+        await self.app(scope, receive, send_recording_write)
@@ -0,0 +1,15 @@
+from fastapi import Response
+from pydantic import TypeAdapter
+from typing import Any
+
+
+class AdapterJSONResponse(Response):
+    """JSON body written by a pydantic TypeAdapter in a single pass, for large list responses.
+
+    Returning a Response makes FastAPI skip validating the return value against the route's response_model a second
+    time, so content must already be validated (e.g. built with the same adapter), or be database rows for a
+    schema.row_list_adapter, and match the response_model."""
+    media_type = "application/json"
+
+    def __init__(self, content: Any, adapter: TypeAdapter, status_code: int = 200, headers: dict[str, str] | None = None):
+        super().__init__(content=adapter.dump_json(content), status_code=status_code, headers=headers)